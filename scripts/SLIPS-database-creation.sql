@@ -56,7 +56,9 @@ CREATE TABLE INW_Transaction (
     Blank                           VARCHAR(30) NOT NULL,
     TimeUpdated                     DATETIME    NOT NULL DEFAULT CURRENT_TIMESTAMP,
     FileName                        VARCHAR(20) NOT NULL,
-    AmountInt                       INTEGER
+    AmountInt                       INTEGER,
+    DestAccountInt                  INTEGER,
+    BranchIndex                     INTEGER
 );
 
 -- OUTWARD TRANSACTIONS
@@ -116,5 +118,7 @@ CREATE TABLE OUT_Transaction (
     Blank                           VARCHAR(30) NOT NULL,
     TimeUpdated                     DATETIME    NOT NULL DEFAULT CURRENT_TIMESTAMP,
     FileName                        VARCHAR(20) NOT NULL,
-    AmountInt                       INTEGER
+    AmountInt                       INTEGER,
+    DestAccountInt                  INTEGER,
+    BranchIndex                     INTEGER
 );
\ No newline at end of file
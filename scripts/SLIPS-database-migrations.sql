@@ -0,0 +1,134 @@
+-- Idempotent schema additions for SQLite
+-- Safe to re-run: applied by init_sqlite_db.py on create and by its --migrate option on an existing SLIPS.db
+-- New columns on existing tables (no ADD COLUMN IF NOT EXISTS in SQLite) are added by init_sqlite_db.py first
+
+-- Load state of every ingested file (append mode replaces a re-sent file's rows by FileName)
+CREATE TABLE IF NOT EXISTS FileRegistry (
+    Id                  INTEGER PRIMARY KEY AUTOINCREMENT,
+    Prefix              VARCHAR(3)  NOT NULL,
+    FileName            VARCHAR(20) NOT NULL,
+    Status              VARCHAR(10) NOT NULL,               -- LOADED / FAILED
+    NumTransactions     INTEGER     NOT NULL DEFAULT 0,
+    NumInserted         INTEGER     NOT NULL DEFAULT 0,
+    NumInvalid          INTEGER     NOT NULL DEFAULT 0,
+    TimeUpdated         DATETIME    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (Prefix, FileName)
+);
+
+-- Superseded by the FileName-leading indexes below
+DROP INDEX IF EXISTS IX_OUT_Transaction_Branch;
+DROP INDEX IF EXISTS IX_INW_Transaction_Branch;
+DROP INDEX IF EXISTS IX_OUT_Transaction_FileBranch;
+DROP INDEX IF EXISTS IX_INW_Transaction_FileBranch;
+
+-- Per-file deletes, branch totals & branch inspection (OUT branches are keyed on the originating branch).
+-- Also covers the typed AmountInt / DestAccountInt columns so integer SUMs never touch the table.
+CREATE INDEX IF NOT EXISTS IX_OUT_Transaction_FileBranchTotals
+    ON OUT_Transaction (FileName, Originating_Branch_No, Transaction_Code, Amount, AmountInt, DestAccountInt, Destination_Ac_No);
+
+-- Per-file deletes, branch totals & branch inspection (INW branches are keyed on the destination branch)
+CREATE INDEX IF NOT EXISTS IX_INW_Transaction_FileBranchTotals
+    ON INW_Transaction (FileName, Destination_Branch_No, Transaction_Code, Amount, AmountInt, DestAccountInt, Destination_Ac_No);
+
+-- Code mapping updates
+CREATE INDEX IF NOT EXISTS IX_OUT_Transaction_Code ON OUT_Transaction (Transaction_Code);
+CREATE INDEX IF NOT EXISTS IX_INW_Transaction_Code ON INW_Transaction (Transaction_Code);
+
+-- Pending branch lookups
+CREATE INDEX IF NOT EXISTS IX_OUT_BranchHeader_Bank ON OUT_BranchHeader (BankCode, Status);
+CREATE INDEX IF NOT EXISTS IX_INW_BranchHeader_Bank ON INW_BranchHeader (BankCode, Status);
+
+-- Branch totals accumulated at insertion time, keyed by file and the transactions' branch column.
+-- Stale = 1 once an UPDATE/DELETE touches the branch's transactions; recreation then recomputes.
+-- Rows whose CodesDigest differs from the current transaction_codes.json are recomputed too.
+CREATE TABLE IF NOT EXISTS OUT_BranchAggregate (
+    FileName            VARCHAR(20) NOT NULL,
+    BranchCode          VARCHAR(3)  NOT NULL,
+    CreditTotal         INTEGER     NOT NULL,
+    NumCreditItems      INTEGER     NOT NULL,
+    DebitTotal          INTEGER     NOT NULL,
+    NumDebitItems       INTEGER     NOT NULL,
+    AccountHashTotal    INTEGER     NOT NULL,
+    NumRows             INTEGER     NOT NULL,
+    NumUnknownCodes     INTEGER     NOT NULL DEFAULT 0,
+    CodesDigest         VARCHAR(64),                        -- codes_digest() of transaction_codes.json used
+    Stale               INTEGER     NOT NULL DEFAULT 0,
+    TimeUpdated         DATETIME    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (FileName, BranchCode)
+);
+
+CREATE TABLE IF NOT EXISTS INW_BranchAggregate (
+    FileName            VARCHAR(20) NOT NULL,
+    BranchCode          VARCHAR(3)  NOT NULL,
+    CreditTotal         INTEGER     NOT NULL,
+    NumCreditItems      INTEGER     NOT NULL,
+    DebitTotal          INTEGER     NOT NULL,
+    NumDebitItems       INTEGER     NOT NULL,
+    AccountHashTotal    INTEGER     NOT NULL,
+    NumRows             INTEGER     NOT NULL,
+    NumUnknownCodes     INTEGER     NOT NULL DEFAULT 0,
+    CodesDigest         VARCHAR(64),                        -- codes_digest() of transaction_codes.json used
+    Stale               INTEGER     NOT NULL DEFAULT 0,
+    TimeUpdated         DATETIME    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (FileName, BranchCode)
+);
+
+CREATE TRIGGER IF NOT EXISTS TR_OUT_Transaction_Update_AggregateStale
+AFTER UPDATE OF Transaction_Code, Amount, Destination_Ac_No, Originating_Branch_No, FileName ON OUT_Transaction
+BEGIN
+    UPDATE OUT_BranchAggregate SET Stale = 1
+    WHERE Stale = 0
+      AND ((FileName = OLD.FileName AND BranchCode = OLD.Originating_Branch_No)
+        OR (FileName = NEW.FileName AND BranchCode = NEW.Originating_Branch_No));
+END;
+
+CREATE TRIGGER IF NOT EXISTS TR_OUT_Transaction_Delete_AggregateStale
+AFTER DELETE ON OUT_Transaction
+BEGIN
+    UPDATE OUT_BranchAggregate SET Stale = 1
+    WHERE Stale = 0 AND FileName = OLD.FileName AND BranchCode = OLD.Originating_Branch_No;
+END;
+
+CREATE TRIGGER IF NOT EXISTS TR_INW_Transaction_Update_AggregateStale
+AFTER UPDATE OF Transaction_Code, Amount, Destination_Ac_No, Destination_Branch_No, FileName ON INW_Transaction
+BEGIN
+    UPDATE INW_BranchAggregate SET Stale = 1
+    WHERE Stale = 0
+      AND ((FileName = OLD.FileName AND BranchCode = OLD.Destination_Branch_No)
+        OR (FileName = NEW.FileName AND BranchCode = NEW.Destination_Branch_No));
+END;
+
+CREATE TRIGGER IF NOT EXISTS TR_INW_Transaction_Delete_AggregateStale
+AFTER DELETE ON INW_Transaction
+BEGIN
+    UPDATE INW_BranchAggregate SET Stale = 1
+    WHERE Stale = 0 AND FileName = OLD.FileName AND BranchCode = OLD.Destination_Branch_No;
+END;
+
+-- Keep the typed columns in step with manual edits of the raw text. Values that are not plain
+-- digits become NULL, which makes recreation fall back to computing those branches in Python.
+CREATE TRIGGER IF NOT EXISTS TR_OUT_Transaction_Update_TypedColumns
+AFTER UPDATE OF Amount, Destination_Ac_No ON OUT_Transaction
+BEGIN
+    UPDATE OUT_Transaction SET
+        AmountInt = CASE
+            WHEN TRIM(NEW.Amount) <> '' AND TRIM(NEW.Amount) NOT GLOB '*[^0-9]*'
+            THEN CAST(TRIM(NEW.Amount) AS INTEGER) END,
+        DestAccountInt = CASE
+            WHEN TRIM(NEW.Destination_Ac_No) <> '' AND TRIM(NEW.Destination_Ac_No) NOT GLOB '*[^0-9]*'
+            THEN CAST(TRIM(NEW.Destination_Ac_No) AS INTEGER) END
+    WHERE Id = NEW.Id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS TR_INW_Transaction_Update_TypedColumns
+AFTER UPDATE OF Amount, Destination_Ac_No ON INW_Transaction
+BEGIN
+    UPDATE INW_Transaction SET
+        AmountInt = CASE
+            WHEN TRIM(NEW.Amount) <> '' AND TRIM(NEW.Amount) NOT GLOB '*[^0-9]*'
+            THEN CAST(TRIM(NEW.Amount) AS INTEGER) END,
+        DestAccountInt = CASE
+            WHEN TRIM(NEW.Destination_Ac_No) <> '' AND TRIM(NEW.Destination_Ac_No) NOT GLOB '*[^0-9]*'
+            THEN CAST(TRIM(NEW.Destination_Ac_No) AS INTEGER) END
+    WHERE Id = NEW.Id;
+END;
@@ -0,0 +1,119 @@
+"""Regression check of SLIPSProcessor.process_all() in replace mode.
+
+Each case loads a previous run (OLD.txt) into a scratch database, then runs
+process_all() over new input files, making the writer fail for some of them
+after their tables were cleared. The OUT tables must end up holding exactly the
+files that loaded in the new run - a failed file must neither keep the previous
+run's rows nor leave them behind for the files after it:
+
+    python scripts/SLIPS_batch_check.py
+    python scripts/SLIPS_batch_check.py --keep
+
+Exits with status 1 if any case fails.
+"""
+
+import argparse
+import contextlib
+import io
+import shutil
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+import SLIPS_insertion
+from SLIPS_benchmark import create_database
+from SLIPS_generator import generate_slip_file, load_transaction_codes
+
+SCRIPT_DIR = Path(__file__).parent
+ROWS_PER_BRANCH = 10
+BRANCHES = 3
+
+# (input files, files the writer fails on, files expected in OUT_Transaction)
+CASES = (
+    (("A.txt", "B.txt"), (), ("A.txt", "B.txt")),
+    (("A.txt", "B.txt"), ("A.txt",), ("B.txt",)),
+    (("A.txt", "B.txt", "C.txt"), ("A.txt", "B.txt"), ("C.txt",)),
+    (("A.txt", "B.txt"), ("B.txt",), ("A.txt",)),
+    (("A.txt",), ("A.txt",), ("OLD.txt",)),
+)
+
+
+@contextlib.contextmanager
+def failing_writer(file_names):
+    """Make DataInserter raise for file_names after the file's tables were cleared"""
+    original = SLIPS_insertion.DataInserter.write_branch_aggregates
+
+    def write_branch_aggregates(self, cursor, prefix):
+        if self.file_name in file_names:
+            raise RuntimeError(f"injected failure for {self.file_name}")
+        return original(self, cursor, prefix)
+
+    SLIPS_insertion.DataInserter.write_branch_aggregates = write_branch_aggregates
+    try:
+        yield
+    finally:
+        SLIPS_insertion.DataInserter.write_branch_aggregates = original
+
+
+def run_case(base: Path, files, failing, workers: int) -> list:
+    """(FileName, rows) in OUT_Transaction after loading OLD.txt, then files"""
+    shutil.rmtree(base, ignore_errors=True)
+    shutil.copytree(SCRIPT_DIR.parent / "config", base / "config")
+    (base / "input").mkdir()
+    (base / "output").mkdir()
+    codes = load_transaction_codes(base / "config")
+
+    def load(names, seed):
+        for offset, name in enumerate(names):
+            generate_slip_file(
+                base / "input" / name, branches=BRANCHES, rows_per_branch=ROWS_PER_BRANCH,
+                invalid_account_ratio=0, transaction_codes=codes, seed=seed + offset,
+            )
+        processor = SLIPS_insertion.SLIPSProcessor(base / "config", base / "input")
+        processor.process_all(workers)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_database(base / "SLIPS.db", SCRIPT_DIR)
+        load(["OLD.txt"], 100)
+        with failing_writer(set(failing)):
+            load(files, 1)
+
+    conn = sqlite3.connect(base / "SLIPS.db")
+    try:
+        return conn.execute(
+            "SELECT FileName, COUNT(*) FROM OUT_Transaction GROUP BY FileName ORDER BY FileName"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def main(workers: int = 2, keep: bool = False) -> bool:
+    scratch = Path(tempfile.mkdtemp(prefix="slips_batch_check_"))
+    failures = 0
+    try:
+        for number, (files, failing, expected) in enumerate(CASES, 1):
+            loaded = run_case(scratch / f"case{number}", files, failing, workers)
+            ok = [name for name, _ in loaded] == list(expected) and all(
+                rows == BRANCHES * ROWS_PER_BRANCH for _, rows in loaded
+            )
+            failures += not ok
+            print(f"{'OK  ' if ok else 'FAIL'} load {', '.join(files)} failing "
+                  f"{', '.join(failing) or '-'}: OUT_Transaction {loaded}, expected {list(expected)}")
+    finally:
+        if keep:
+            print(f"Scratch databases kept in {scratch}")
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    print("OK: all cases passed." if not failures else f"FAILED: {failures} cases.")
+    return not failures
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Check process_all() replace mode around failed files")
+    arg_parser.add_argument("--workers", type=int, default=2, help="parser processes")
+    arg_parser.add_argument("--keep", action="store_true", help="keep the scratch databases")
+    args = arg_parser.parse_args()
+
+    sys.exit(0 if main(args.workers, args.keep) else 1)
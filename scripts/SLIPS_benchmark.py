@@ -0,0 +1,260 @@
+"""End-to-end throughput benchmark for the insertion and recreation workflows.
+
+For each size, generates a synthetic OUT file into a scratch base directory
+(config copy + fresh SLIPS.db) and times every stage separately:
+
+    parse_dataset   RecordParser.parse_dataset over the whole file
+    parse_stream    RecordParser.iter_events (time spent producing records during insert)
+    insert          DataInserter / SLIPSProcessor load, excluding parse_stream
+    branch_totals   BranchService.update_branch_status_and_totals (stored aggregates)
+    branch_totals_sql   the same with the aggregates marked stale, so totals come from SQL
+    inspect         BranchInspector.check_and_filter
+    security        TransactionSecurityUpdater.update_security_fields
+    recreate        FileRecreator.recreate
+
+Results are written as JSON to output/ so runs can be compared between versions:
+
+    python scripts/SLIPS_benchmark.py --sizes 10000 100000 1000000
+    python scripts/SLIPS_benchmark.py --sizes 10000 --compare output/benchmark_20250101_120000.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import SLIPS_insertion
+import SLIPS_recreation
+from SLIPS_generator import generate_slip_file, load_transaction_codes
+from SLIPS_metrics import METRICS
+from init_sqlite_db import apply_migrations
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_BRANCHES = 100
+BANK_CODE = "7135"
+PREFIX = "OUT"
+RESULTS_VERSION = 1
+
+
+class TimedEvents:
+    """Wraps an iterator and accumulates the time spent producing its items"""
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return next(self._iterator)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+def create_database(db_path: Path, script_dir: Path):
+    conn = sqlite3.connect(str(db_path))
+    cursor = conn.cursor()
+    with open(script_dir / "SLIPS-database-creation.sql", "r") as f:
+        cursor.executescript(f.read())
+    apply_migrations(cursor, script_dir)
+    conn.commit()
+    conn.close()
+
+
+def git_commit(repo_dir: Path):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=repo_dir, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def stage_result(seconds: float, rows: int) -> dict:
+    return {
+        "seconds": round(seconds, 4),
+        "rows": rows,
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+    }
+
+
+def run_size(rows: int, branches: int, repo_dir: Path, keep: bool = False, verbose: bool = False) -> dict:
+    script_dir = repo_dir / "scripts"
+    base = Path(tempfile.mkdtemp(prefix=f"slips_bench_{rows}_"))
+    stages = {}
+    METRICS.reset()
+
+    try:
+        shutil.copytree(repo_dir / "config", base / "config")
+        (base / "input").mkdir()
+        (base / "output").mkdir()
+
+        codes = load_transaction_codes(base / "config")
+        file_name = f"BENCH_{rows}.txt"
+        file_path = base / "input" / file_name
+
+        started = time.perf_counter()
+        generated = generate_slip_file(
+            file_path,
+            branches=branches,
+            rows_per_branch=max(1, rows // branches),
+            transaction_codes=codes,
+        )
+        stages["generate"] = stage_result(time.perf_counter() - started, generated)
+
+        with contextlib.ExitStack() as quiet:
+            if not verbose:
+                devnull = quiet.enter_context(open(os.devnull, "w"))
+                quiet.enter_context(contextlib.redirect_stdout(devnull))
+
+            create_database(base / "SLIPS.db", script_dir)
+
+            # ---- parse_dataset (whole-file parser) ----
+            parser = SLIPS_insertion.RecordParser(codes)
+            started = time.perf_counter()
+            with open(file_path, "r", encoding="utf-8") as f:
+                groups = parser.parse_dataset(f.read(), file_name)
+            parsed = sum(len(b["data"]) for g in groups for b in g["branches"])
+            stages["parse_dataset"] = stage_result(time.perf_counter() - started, parsed)
+            del groups
+
+            # ---- insert (streaming parser + bulk load) ----
+            processor = SLIPS_insertion.SLIPSProcessor(base / "config", base / "input")
+            started = time.perf_counter()
+            with open(file_path, "r", encoding="utf-8") as f:
+                events = TimedEvents(processor.parser.iter_events(f, file_name))
+                summary = processor._load(file_name, events)
+            load_seconds = time.perf_counter() - started
+            stages["parse_stream"] = stage_result(events.seconds, summary["transactions"])
+            stages["insert"] = stage_result(load_seconds - events.seconds, summary["inserted"])
+            inserted = summary["inserted"]
+
+            # ---- recreation stages ----
+            SLIPS_recreation.Settings.initialize_paths(base)
+            code_service = SLIPS_recreation.CodeMappingService()
+            analyzer = SLIPS_recreation.TransactionAnalyzer(code_service)
+
+            started = time.perf_counter()
+            SLIPS_recreation.BranchService(analyzer, code_service).update_branch_status_and_totals(
+                0, BANK_CODE, PREFIX
+            )
+            stages["branch_totals"] = stage_result(time.perf_counter() - started, inserted)
+
+            reset = SLIPS_recreation.Database.get_connection()
+            reset.execute(f"UPDATE {PREFIX}_BranchHeader SET Status = 0")
+            reset.execute(f"UPDATE {PREFIX}_BranchAggregate SET Stale = 1")
+            reset.close()
+
+            started = time.perf_counter()
+            SLIPS_recreation.BranchService(analyzer, code_service).update_branch_status_and_totals(
+                0, BANK_CODE, PREFIX
+            )
+            stages["branch_totals_sql"] = stage_result(time.perf_counter() - started, inserted)
+
+            started = time.perf_counter()
+            SLIPS_recreation.BranchInspector().check_and_filter(BANK_CODE, PREFIX)
+            stages["inspect"] = stage_result(time.perf_counter() - started, inserted)
+
+            started = time.perf_counter()
+            SLIPS_recreation.TransactionSecurityUpdater(code_service).update_security_fields(PREFIX)
+            stages["security"] = stage_result(time.perf_counter() - started, inserted)
+
+            started = time.perf_counter()
+            SLIPS_recreation.FileRecreator().recreate(PREFIX)
+            stages["recreate"] = stage_result(time.perf_counter() - started, inserted)
+
+    finally:
+        SLIPS_recreation.Database.close_all()
+        if keep:
+            print(f"Kept benchmark directory: {base}")
+        else:
+            shutil.rmtree(base, ignore_errors=True)
+
+    # Instrumented stage detail (SQL statements, connections, peak memory)
+    metrics = METRICS.as_dict("benchmark")["stages"]
+    METRICS.reset()
+    return {"rows": rows, "branches": branches, "stages": stages, "metrics": metrics}
+
+
+def print_results(results: dict, previous: dict = None):
+    previous_runs = {run["rows"]: run for run in (previous or {}).get("runs", [])}
+
+    for run in results["runs"]:
+        print("=" * 78)
+        print(f"{run['rows']:,} rows, {run['branches']} branches")
+        print("-" * 78)
+        header = f"{'Stage':<20}{'Seconds':>10}{'Rows/sec':>16}"
+        if run["rows"] in previous_runs:
+            header += f"{'Previous':>12}{'Speed-up':>12}"
+        print(header)
+
+        before = previous_runs.get(run["rows"], {}).get("stages", {})
+        for name, stage in run["stages"].items():
+            rate = f"{stage['rows_per_sec']:,.0f}" if stage["rows_per_sec"] else "-"
+            line = f"{name:<20}{stage['seconds']:>10.3f}{rate:>16}"
+            if name in before:
+                old = before[name]["seconds"]
+                speedup = f"{old / stage['seconds']:.2f}x" if stage["seconds"] > 0 else "-"
+                line += f"{old:>12.3f}{speedup:>12}"
+            print(line)
+    print("=" * 78)
+
+
+def main(sizes, branches=DEFAULT_BRANCHES, output=None, compare=None, keep=False, verbose=False):
+    repo_dir = Path(__file__).parent.parent
+    results = {
+        "version": RESULTS_VERSION,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(repo_dir),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "runs": [],
+    }
+
+    for rows in sizes:
+        print(f"Benchmarking {rows:,} rows...")
+        results["runs"].append(run_size(rows, branches, repo_dir, keep, verbose))
+
+    if output is None:
+        output = repo_dir / "output" / f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    previous = None
+    if compare:
+        with open(compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    print_results(results, previous)
+    print(f"Results written to {output}")
+    return results
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the SLIPS workflows")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    arg_parser.add_argument("--branches", type=int, default=DEFAULT_BRANCHES)
+    arg_parser.add_argument("--output", type=Path, default=None, help="results JSON path")
+    arg_parser.add_argument("--compare", type=Path, default=None, help="previous results JSON")
+    arg_parser.add_argument("--keep", action="store_true", help="keep the scratch directories")
+    arg_parser.add_argument("--verbose", action="store_true", help="show the workflows' own output")
+    args = arg_parser.parse_args()
+
+    sys.exit(
+        0 if main(args.sizes, args.branches, args.output, args.compare, args.keep, args.verbose) else 1
+    )
@@ -0,0 +1,162 @@
+"""Cached, validated JSON configuration shared by the insertion and recreation workflows.
+
+Each config file is parsed and validated once and kept in memory. Every lookup
+stats the file; it is re-read only when its mtime or size changes, and
+re-parsed only when its content hash changes too, so a long-running process
+picks up edits without restarting. A file that becomes invalid keeps its last
+good version (with an error printed) until it is fixed.
+
+    codes = CONFIG.transaction_codes(base_path / "config")
+
+Returned values are shared between callers and must not be modified.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+TRANSACTION_CODES = "transaction_codes.json"
+CODE_MAPPINGS = "transaction_codes_mapping.json"
+BANK_HOLIDAYS = "bank_holidays.json"
+
+TRANSACTION_TYPES = ("C", "D")
+
+
+# ---------------------- Validation ----------------------
+# Each validator takes the parsed JSON and returns (value, problems); entries
+# that cannot be used are dropped and reported.
+def validate_transaction_codes(data) -> Tuple[dict, List[str]]:
+    if not isinstance(data, dict):
+        return {}, ["expected an object of code -> {type, desc}"]
+
+    codes = {}
+    problems = []
+    for code, info in data.items():
+        if not isinstance(info, dict):
+            problems.append(f"code '{code}': expected an object, skipped")
+            continue
+        if str(info.get("type", "")).upper() not in TRANSACTION_TYPES:
+            # Kept: the code is known, but counts as neither credit nor debit
+            problems.append(f"code '{code}': type {info.get('type')!r} is not C or D")
+        codes[code] = info
+    return codes, problems
+
+
+def validate_code_mappings(data) -> Tuple[dict, List[str]]:
+    if not isinstance(data, dict):
+        return {}, ["expected an object of id -> {old, new}"]
+
+    mappings = {}
+    problems = []
+    for key, entry in data.items():
+        if not isinstance(entry, dict) or str(entry.get("old", "")).strip() == "" \
+                or str(entry.get("new", "")).strip() == "":
+            problems.append(f"mapping '{key}': needs both 'old' and 'new', skipped")
+            continue
+        mappings[key] = entry
+    return mappings, problems
+
+
+def validate_holidays(data) -> Tuple[tuple, List[str]]:
+    if not isinstance(data, list):
+        return (), ["expected a list of {year, month, day}"]
+
+    holidays = []
+    problems = []
+    for item in data:
+        try:
+            holidays.append(date(item["year"], item["month"], item["day"]))
+        except (KeyError, TypeError, ValueError) as e:
+            problems.append(f"entry {item!r}: {e}, skipped")
+    return tuple(holidays), problems
+
+
+# ---------------------- Registry ----------------------
+class _Entry:
+    __slots__ = ("signature", "digest", "value")
+
+    def __init__(self, signature, digest, value):
+        self.signature = signature  # (mtime_ns, size), None while the file is missing
+        self.digest = digest        # sha256 of the last content read
+        self.value = value          # last good validated value
+
+
+class ConfigRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # absolute path -> _Entry
+        self.parses = 0     # files parsed (not served from cache), for diagnostics
+
+    def get(self, path: Path, validate: Optional[Callable] = None, default: Callable = dict):
+        """Validated content of a JSON file; default() if it is missing or was never valid"""
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            try:
+                stat = os.stat(key)
+            except OSError:
+                if entry is None or entry.signature is not None:
+                    print(f"Warning: config file '{path}' not found.")
+                    entry = self._entries[key] = _Entry(None, None, default())
+                return entry.value
+
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if entry is not None and entry.signature == signature:
+                return entry.value
+
+            try:
+                with open(key, "rb") as f:
+                    raw = f.read()
+            except OSError as e:
+                print(f"Error: cannot read config file '{path}': {e}")
+                return entry.value if entry is not None else default()
+
+            digest = hashlib.sha256(raw).hexdigest()
+            if entry is not None and entry.digest == digest:
+                # Touched but unchanged
+                entry.signature = signature
+                return entry.value
+
+            previous = entry.value if entry is not None and entry.signature is not None else None
+            try:
+                data = json.loads(raw.decode("utf-8"))
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                if previous is not None:
+                    print(f"Error: Invalid JSON in '{path}': {e} (keeping the previously loaded version)")
+                else:
+                    print(f"Error: Invalid JSON in '{path}': {e}")
+                value = previous if previous is not None else default()
+                self._entries[key] = _Entry(signature, digest, value)
+                return value
+
+            self.parses += 1
+            value = data
+            if validate is not None:
+                value, problems = validate(data)
+                for problem in problems:
+                    print(f"Warning: {Path(path).name}: {problem}")
+
+            self._entries[key] = _Entry(signature, digest, value)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # ---- the SLIPS config files ----
+    def transaction_codes(self, config_dir: Path) -> dict:
+        return self.get(Path(config_dir) / TRANSACTION_CODES, validate_transaction_codes)
+
+    def code_mappings(self, config_dir: Path) -> dict:
+        return self.get(Path(config_dir) / CODE_MAPPINGS, validate_code_mappings)
+
+    def holidays(self, config_dir: Path) -> tuple:
+        return self.get(Path(config_dir) / BANK_HOLIDAYS, validate_holidays, tuple)
+
+
+# One registry per process; both workflows read their config through it
+CONFIG = ConfigRegistry()
@@ -0,0 +1,163 @@
+"""Synthetic SLIP file generator for benchmarks and manual testing.
+
+Writes valid single-line fixed-width files (5555 file header, 4444 branch
+headers, 0000 transactions) using the SLIPS_records layouts. Branch headers
+carry correct credit/debit totals and account hash totals.
+
+    python scripts/SLIPS_generator.py input/OUT_SAMPLE.txt --branches 20 --rows 500
+"""
+
+import argparse
+import random
+from pathlib import Path
+from typing import Dict, Optional
+
+from SLIPS_config import CONFIG
+from SLIPS_records import (
+    BRANCH_HEADER,
+    BRANCH_HEADER_MARKER,
+    BranchTotals,
+    FILE_HEADER,
+    FILE_HEADER_MARKER,
+    TRANSACTION,
+    TRANSACTION_MARKER,
+)
+
+# Mostly credits, as in a typical outward salary/payment file
+DEFAULT_CODE_MIX = {"23": 40, "52": 30, "22": 10, "31": 15, "33": 5}
+WRITE_BUFFER = 1 << 20  # 1 MiB
+
+
+def load_transaction_codes(config_dir: Path) -> dict:
+    return CONFIG.transaction_codes(config_dir)
+
+
+def generate_slip_file(
+    path: Path,
+    branches: int = 10,
+    rows_per_branch: int = 100,
+    code_mix: Optional[Dict[str, int]] = None,
+    zero_amount_ratio: float = 0.05,
+    invalid_account_ratio: float = 0.01,
+    prefix: str = "OUT",
+    bank_code: str = "7135",
+    file_date: str = "25289",
+    value_date: str = "251016",
+    transaction_codes: Optional[dict] = None,
+    seed: int = 1,
+) -> int:
+    """Write one SLIP file and return the number of transactions written.
+
+    code_mix maps transaction code -> relative weight. zero_amount_ratio and
+    invalid_account_ratio are the share of rows with a '000000000000' amount and
+    with a non-numeric account (rejected when an OUT file is inserted).
+    transaction_codes (transaction_codes.json) is needed for the branch totals;
+    without it the branch headers are written with zero totals.
+    """
+    if prefix not in ("OUT", "INW"):
+        raise ValueError(f"Invalid prefix: {prefix}")
+    if not 1 <= branches <= 999:
+        raise ValueError("branches must be between 1 and 999")
+
+    rng = random.Random(seed)
+    code_mix = code_mix or DEFAULT_CODE_MIX
+    codes = list(code_mix)
+    weights = [code_mix[c] for c in codes]
+    field_id = "OUT" if prefix == "OUT" else "IN "
+    total = branches * rows_per_branch
+    blank = TRANSACTION.blank()
+
+    with open(path, "w", encoding="utf-8", newline="", buffering=WRITE_BUFFER) as out:
+        out.write(
+            FILE_HEADER.format_data(
+                # NoOfTransactions is 6 digits wide; larger benchmark files saturate it
+                (FILE_HEADER_MARKER, field_id, file_date, bank_code, branches, min(total, 999999))
+            )
+        )
+
+        for b in range(1, branches + 1):
+            branch_code = f"{b:03d}"
+            totals = BranchTotals()
+            lines = []
+            for code in rng.choices(codes, weights, k=rows_per_branch):
+                amount = 0 if rng.random() < zero_amount_ratio else rng.randint(100, 10**9)
+                dest_account = f"{rng.randrange(10**12):012d}"
+                org_account = f"{rng.randrange(10**12):012d}"
+                if rng.random() < invalid_account_ratio:
+                    dest_account = "ACC" + dest_account[3:]
+
+                if prefix == "OUT":
+                    # Our branch originates; destination is any bank
+                    dest_bank, dest_branch = f"{rng.randint(7010, 7999)}", f"{rng.randint(1, 999):03d}"
+                    org_bank, org_branch = bank_code, branch_code
+                else:
+                    dest_bank, dest_branch = bank_code, branch_code
+                    org_bank, org_branch = f"{rng.randint(7010, 7999)}", f"{rng.randint(1, 999):03d}"
+
+                amount_text = f"{amount:012d}"
+                if transaction_codes is not None:
+                    totals.add(code, amount_text, dest_account, transaction_codes)
+
+                lines.append(
+                    TRANSACTION.format_data(
+                        (
+                            TRANSACTION_MARKER, dest_bank, dest_branch, dest_account,
+                            "DEST NAME", code, "00", "0", "000000", amount_text, "LKR",
+                            org_bank, org_branch, org_account, "ORG NAME",
+                            "PART", "REF", value_date, "000000",
+                        ),
+                        blank,
+                    )
+                )
+
+            credit_total, credit_count, debit_total, debit_count, hash_total = totals.totals()
+            out.write(
+                BRANCH_HEADER.format_data(
+                    (
+                        BRANCH_HEADER_MARKER, field_id, file_date, bank_code, branch_code,
+                        credit_total, credit_count, debit_total, debit_count,
+                        # Hash total is 18 digits wide; keep the low-order digits
+                        hash_total % 10**18,
+                    )
+                )
+            )
+            out.write("".join(lines))
+
+    return total
+
+
+def parse_code_mix(text: str) -> Dict[str, int]:
+    """'23:40,52:30,31:15' -> {'23': 40, '52': 30, '31': 15}"""
+    mix = {}
+    for part in text.split(","):
+        code, _, weight = part.partition(":")
+        mix[code.strip()] = int(weight or 1)
+    return mix
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Generate a synthetic SLIP file")
+    arg_parser.add_argument("path", type=Path)
+    arg_parser.add_argument("--branches", type=int, default=10)
+    arg_parser.add_argument("--rows", type=int, default=100, help="transactions per branch")
+    arg_parser.add_argument("--codes", type=parse_code_mix, default=None,
+                            help="code mix, e.g. 23:40,52:30,31:15")
+    arg_parser.add_argument("--zero-ratio", type=float, default=0.05)
+    arg_parser.add_argument("--invalid-ratio", type=float, default=0.01)
+    arg_parser.add_argument("--prefix", choices=("OUT", "INW"), default="OUT")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    config_dir = Path(__file__).parent.parent / "config"
+    written = generate_slip_file(
+        args.path,
+        branches=args.branches,
+        rows_per_branch=args.rows,
+        code_mix=args.codes,
+        zero_amount_ratio=args.zero_ratio,
+        invalid_account_ratio=args.invalid_ratio,
+        prefix=args.prefix,
+        transaction_codes=load_transaction_codes(config_dir),
+        seed=args.seed,
+    )
+    print(f"Wrote {written} transactions to {args.path}")
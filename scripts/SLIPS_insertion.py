@@ -1,30 +1,67 @@
+import mmap
+import os
+import queue
 import sqlite3
-import json
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from operator import attrgetter
 from pathlib import Path
 
+from SLIPS_config import CONFIG
+from SLIPS_metrics import METRICS
+from SLIPS_records import (
+    BRANCH_HEADER,
+    BRANCH_HEADER_MARKER,
+    BranchTotals,
+    FILE_HEADER,
+    FILE_HEADER_MARKER,
+    RECORD_LENGTH,
+    RECORD_MARKERS,
+    RecordScanner,
+    TRANSACTION,
+    TRANSACTION_MARKER,
+    TransactionBatch,
+    TransactionCodeMapper,
+    TransactionRecord,
+    account_hash_value,
+    amount_int,
+    codes_digest,
+    misaligned_record,
+)
+
 
 class ConfigLoader:
+    """Config for the insertion workflow, read through the shared CONFIG registry"""
+
     def __init__(self, config_dir):
         self.config_dir = config_dir
-        self.transaction_codes = self.load_transaction_codes()
 
-    def load_transaction_codes(self):
-        json_file_path = self.config_dir / "transaction_codes.json"
-        try:
-            with open(json_file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+    @property
+    def transaction_codes(self):
+        return CONFIG.transaction_codes(self.config_dir)
+
+    @property
+    def code_mappings(self):
+        return CONFIG.code_mappings(self.config_dir)
+
+    def code_mapper(self):
+        return TransactionCodeMapper(self.transaction_codes, self.code_mappings)
 
 
 class DatabaseManager:
     def __init__(self, db_path):
         self.db_path = db_path
         self.conn = None
+        self.registry_available = None  # FileRegistry present (checked once)
+        self.aggregates_available = {}  # prefix -> {prefix}_BranchAggregate present and migrated
 
     def connect(self):
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = METRICS.watch(sqlite3.connect(self.db_path))
             # Enable foreign keys and better text handling
             self.conn.execute("PRAGMA foreign_keys = ON")
             self.conn.execute("PRAGMA encoding = 'UTF-8'")
@@ -40,6 +77,9 @@ class DatabaseManager:
         if prefix not in valid_prefixes:
             raise ValueError(f"Invalid prefix: {prefix}")
 
+        if self.has_aggregates(cursor, prefix):
+            cursor.execute(f"DELETE FROM {prefix}_BranchAggregate")
+
         for table in [
             f"{prefix}_FileHeader",
             f"{prefix}_BranchHeader",
@@ -47,6 +87,83 @@ class DatabaseManager:
         ]:
             cursor.execute(f"DELETE FROM {table}")
 
+        if self.has_registry(cursor):
+            cursor.execute("DELETE FROM FileRegistry WHERE Prefix = ?", (prefix,))
+
+    def clear_file(self, cursor, prefix, file_name):
+        """Append mode: remove only the rows of a previously loaded copy of file_name"""
+        valid_prefixes = ["INW", "OUT"]
+
+        if prefix not in valid_prefixes:
+            raise ValueError(f"Invalid prefix: {prefix}")
+
+        # Aggregates first, so the delete trigger has no rows left to mark stale
+        if self.has_aggregates(cursor, prefix):
+            cursor.execute(
+                f"DELETE FROM {prefix}_BranchAggregate WHERE FileName = ?", (file_name,)
+            )
+
+        removed = 0
+        for table in [
+            f"{prefix}_FileHeader",
+            f"{prefix}_BranchHeader",
+            f"{prefix}_Transaction",
+        ]:
+            cursor.execute(f"DELETE FROM {table} WHERE FileName = ?", (file_name,))
+            removed += max(cursor.rowcount, 0)
+
+        if removed:
+            print(f"Replacing previously loaded rows of {file_name} ({removed} rows removed)")
+
+    def has_registry(self, cursor):
+        if self.registry_available is None:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'FileRegistry'"
+            )
+            self.registry_available = cursor.fetchone() is not None
+            if not self.registry_available:
+                print("WARNING: FileRegistry table missing - run 'python scripts/init_sqlite_db.py --migrate'")
+
+        return self.registry_available
+
+    def has_aggregates(self, cursor, prefix):
+        """{prefix}_BranchAggregate is present and migrated (has CodesDigest)"""
+        if prefix not in self.aggregates_available:
+            cursor.execute(f"PRAGMA table_info({prefix}_BranchAggregate)")
+            columns = {row[1] for row in cursor.fetchall()}
+            if columns and "CodesDigest" not in columns:
+                print(
+                    f"WARNING: {prefix}_BranchAggregate has no CodesDigest column - "
+                    "run 'python scripts/init_sqlite_db.py --migrate'"
+                )
+            self.aggregates_available[prefix] = "CodesDigest" in columns
+
+        return self.aggregates_available[prefix]
+
+    def register_file(self, cursor, prefix, file_name, status, transactions=0, inserted=0, invalid=0):
+        """Record the load state of a file in FileRegistry"""
+        if not self.has_registry(cursor):
+            return
+
+        cursor.execute(
+            """
+            INSERT INTO FileRegistry (Prefix, FileName, Status, NumTransactions, NumInserted, NumInvalid)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (Prefix, FileName) DO UPDATE SET
+                Status = excluded.Status,
+                NumTransactions = excluded.NumTransactions,
+                NumInserted = excluded.NumInserted,
+                NumInvalid = excluded.NumInvalid,
+                TimeUpdated = CURRENT_TIMESTAMP
+            """,
+            (prefix, file_name, status, transactions, inserted, invalid),
+        )
+
+    def begin(self):
+        """Open an explicit write transaction for the whole load."""
+        if self.conn and not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+
     def commit_and_close(self):
         if self.conn:
             self.conn.commit()
@@ -54,132 +171,232 @@ class DatabaseManager:
 
 
 class RecordParser:
-    def __init__(self, transaction_codes):
+    RECORD_LENGTH = RECORD_LENGTH
+    READ_CHUNK_RECORDS = 4096  # records pulled from disk per read in streaming mode
+    # Transaction fields this wide or narrower (bank/branch numbers, codes, dates,
+    # currency) repeat heavily, so each distinct value is stored once per file
+    SHARED_VALUE_MAX_WIDTH = 6
+
+    _CODE = TransactionRecord._fields.index("TransactionCode")
+    _AMOUNT = TransactionRecord._fields.index("Amount")
+    _DEST_ACCOUNT = TransactionRecord._fields.index("DestAccount")
+
+    def __init__(self, transaction_codes, code_mapper=None):
         self.transaction_codes = transaction_codes
+        # Old codes are rewritten as they are parsed (see TransactionCodeMapper)
+        self.code_mapper = code_mapper
+        self.reset_shared_values()
+
+    def reset_shared_values(self):
+        """Start a new file: forget the repeated short values kept from the last one"""
+        self._shared_values = [
+            (i, {})
+            for i, name in enumerate(TRANSACTION.data_names)
+            if TRANSACTION.width_of(name) <= self.SHARED_VALUE_MAX_WIDTH
+        ]
 
     def parse_header1(self, line, file_name):
-        return {
-            "BankControlId": line[0:4],
-            "FieldId": line[4:7],
-            "Date": line[7:12],
-            "BankCode": line[12:16],
-            "NoOfBatches": line[16:19],
-            "NoOfTransactions": line[19:25],
-            "FileName": file_name,
-        }
+        header = FILE_HEADER.parse_dict(line)
+        header["FileName"] = file_name
+        return header
 
     def parse_header2(self, line, file_name):
-        return {
-            "BranchControlId": line[0:4],
-            "FieldId": line[4:7],
-            "Date": line[7:12],
-            "BankCode": line[12:16],
-            "BranchCode": line[16:19],
-            "CreditTotal": line[19:34],
-            "NoOfCreditItems": line[34:40],
-            "DebitTotal": line[40:55],
-            "NoOfDebitItems": line[55:61],
-            "HashTotal": line[61:79],
-            "FileName": file_name,
-        }
-
-    def parse_data_record(self, line, file_name):
-        code = line[43:45]
-        desc = self.transaction_codes.get(code, {}).get("desc", "Unknown")
-        return {
-            "TransactionId": line[0:4],
-            "DestBank": line[4:8],
-            "DestBranch": line[8:11],
-            "DestAccount": line[11:23],
-            "DestName": line[23:43],
-            "ReturnCode": line[45:47],
-            "Filler": line[47:48],
-            "ReturnDate": line[48:54],
-            "TransactionCode": code,
-            "TransactionDesc": desc,
-            "Amount": line[54:66],
-            "Currency": line[66:69],
-            "OriginatingBankNo": line[69:73],
-            "OriginatingBranchNo": line[73:76],
-            "OriginatingAccountNo": line[76:88],
-            "OriginatorAccountName": line[88:108],
-            "Particular": line[108:123],
-            "Reference": line[123:138],
-            "ValueDate": line[138:144],
-            "SecurityCheck": line[144:150],
-            "FileName": file_name,
-            "AmountInt": line[54:66].strip(),
-        }
+        header = BRANCH_HEADER.parse_dict(line)
+        header["FileName"] = file_name
+        return header
+
+    def parse_data_record(self, line):
+        """One transaction as a TransactionRecord (the file name is not stored per record)"""
+        fields = list(TRANSACTION.parse_data(line))
+        for i, seen in self._shared_values:
+            value = fields[i]
+            fields[i] = seen.setdefault(value, value)
+        if self.code_mapper is not None:
+            fields[self._CODE] = self.code_mapper.map(fields[self._CODE])
+        # Typed copies, parsed once here so aggregates are plain integer SUMs
+        fields.append(amount_int(fields[self._AMOUNT]))
+        fields.append(account_hash_value(fields[self._DEST_ACCOUNT]))
+        return TransactionRecord._make(fields)
 
     def parse_dataset(self, dataset, file_name):
+        """Parse a whole SLIP file held in memory: the first file header group only.
+
+        Record boundaries come from one RecordScanner pass, which raises
+        RecordFormatError if a record is out of the 180-character stride.
+        """
         parsed_groups = []
-        first_5555 = dataset.find("5555")
+        self.reset_shared_values()
+        scanner = RecordScanner(dataset)
+        first_5555 = scanner.find(FILE_HEADER_MARKER)
 
-        if first_5555 == -1:
+        if first_5555 is None:
             return parsed_groups
 
-        if first_5555 + 180 <= len(dataset):
-            header1_line = dataset[first_5555 : first_5555 + 180]
-            header1 = self.parse_header1(header1_line, file_name)
-            branch_data = self.find_branch_data(dataset, first_5555 + 180, file_name)
-            parsed_groups.append(
-                {
-                    "type": header1["FieldId"],
-                    "header1": header1,
-                    "branches": branch_data,
-                }
-            )
+        header1 = self.parse_header1(scanner.record(first_5555), file_name)
+        branch_data = self.find_branch_data(
+            dataset, scanner.offset(first_5555 + 1), file_name, scanner
+        )
+        parsed_groups.append(
+            {
+                "type": header1["FieldId"],
+                "header1": header1,
+                "branches": branch_data,
+            }
+        )
         return parsed_groups
 
-    def find_branch_data(self, dataset, start_pos, file_name):
+    def find_branch_data(self, dataset, start_pos, file_name, scanner=None):
+        """Branches from start_pos up to the next file header; scanner is dataset's RecordScanner, if built"""
+        if scanner is None:
+            scanner = RecordScanner(dataset)
         branches = []
-        pos = start_pos
+        index = scanner.index_at(start_pos)
 
-        while pos < len(dataset):
-            next_4444 = dataset.find("4444", pos)
-            if next_4444 == -1:
+        while index < len(scanner):
+            marker = scanner.marker(index)
+            if marker == FILE_HEADER_MARKER:
                 break
+            if marker != BRANCH_HEADER_MARKER:
+                index += 1
+                continue
 
-            next_5555 = dataset.find("5555", pos)
-            if next_5555 != -1 and next_5555 < next_4444:
-                break
+            header2 = self.parse_header2(scanner.record(index), file_name)
+            transactions = self.find_transactions(
+                dataset, scanner.offset(index + 1), file_name, scanner
+            )
+            branches.append({"header2": header2, "data": transactions})
+            index += 1 + len(transactions)
 
-            if next_4444 + 180 <= len(dataset):
-                header2_line = dataset[next_4444 : next_4444 + 180]
-                header2 = self.parse_header2(header2_line, file_name)
-                transaction_start = next_4444 + 180
-                transactions = self.find_transactions(
-                    dataset, transaction_start, file_name
-                )
-                branches.append({"header2": header2, "data": transactions})
-                pos = transaction_start + (len(transactions) * 180)
-            else:
+        return branches
+
+    def find_transactions(self, dataset, start_pos, file_name, scanner=None):
+        """The contiguous run of transactions starting at start_pos"""
+        if scanner is None:
+            scanner = RecordScanner(dataset)
+        start = scanner.index_at(start_pos)
+        end = scanner.run_end(start, TRANSACTION_MARKER)
+        parse = self.parse_data_record
+        return [parse(dataset[pos : pos + RECORD_LENGTH]) for pos in scanner.offsets[start:end]]
+
+    def iter_raw_records(self, file_obj):
+        """Yield fixed-width records from an open text file, one stride at a time.
+
+        The stride starts at the first file header, so a UTF-8 BOM or other
+        leading bytes are skipped. Line breaks between records are tolerated; a
+        trailing partial record is dropped. A record that does not start with a
+        known marker raises RecordFormatError with its character offset (the
+        byte offset in an ASCII file).
+        """
+        record_length = self.RECORD_LENGTH
+        chunk_size = record_length * self.READ_CHUNK_RECORDS
+        keep = len(FILE_HEADER_MARKER) - 1
+        base = 0  # file offset of buffer[0]
+        buffer = ""
+
+        while True:
+            chunk = file_obj.read(chunk_size)
+            if not chunk:
+                return  # no file header
+            buffer += chunk
+            pos = buffer.find(FILE_HEADER_MARKER)
+            if pos != -1:
+                break
+            # A marker may straddle two chunks
+            base += max(0, len(buffer) - keep)
+            buffer = buffer[-keep:]
+
+        while True:
+            end = len(buffer)
+            while True:
+                while pos < end and buffer[pos] in "\r\n":
+                    pos += 1
+                if pos + record_length > end:
+                    break
+                record = buffer[pos : pos + record_length]
+                if record[:4] not in RECORD_MARKERS:
+                    raise misaligned_record(buffer, pos, base)
+                yield record
+                pos += record_length
+
+            chunk = file_obj.read(chunk_size)
+            if not chunk:
                 break
+            base += pos
+            buffer = buffer[pos:] + chunk
+            pos = 0
 
-        return branches
+    def iter_events(self, file_obj, file_name):
+        """Stream parse events from an open SLIP file without loading it into memory.
 
-    def find_transactions(self, dataset, start_pos, file_name):
-        transactions = []
-        pos = start_pos
+        Yields ("file_header", header1), ("branch_header", header2) and
+        ("transaction", record) tuples in file order, following the same rules as
+        parse_dataset: only the first file header group is read, and transactions
+        are only taken from the contiguous run that follows a branch header.
+        """
+        return self.iter_line_events(self.iter_raw_records(file_obj), file_name)
 
-        while pos + 180 <= len(dataset):
-            if dataset[pos : pos + 4] == "0000":
-                transaction_line = dataset[pos : pos + 180]
-                transaction = self.parse_data_record(transaction_line, file_name)
-                transactions.append(transaction)
-                pos += 180
-            else:
-                break
+    def iter_line_events(self, lines, file_name, in_file=False):
+        """iter_events() over an iterable of 180-char records.
 
-        return transactions
+        in_file: the records start inside the file header group (a branch segment
+        taken from the middle of a file, see SegmentParser).
+        """
+        in_branch = False
+        self.reset_shared_values()
+
+        for line in lines:
+            marker = line[0:4]
+
+            if marker == FILE_HEADER_MARKER:
+                if in_file:
+                    break
+                in_file = True
+                yield "file_header", self.parse_header1(line, file_name)
+            elif not in_file:
+                continue
+            elif marker == BRANCH_HEADER_MARKER:
+                in_branch = True
+                yield "branch_header", self.parse_header2(line, file_name)
+            elif marker == TRANSACTION_MARKER and in_branch:
+                yield "transaction", self.parse_data_record(line)
+            else:
+                # Anything else ends the current branch's transaction run
+                in_branch = False
 
 
 class DataInserter:
-    def __init__(self, db_manager, config_dir: Path):
+    DEFAULT_BATCH_SIZE = 5000
+
+    # Transaction field holding the branch a transaction is totalled under
+    BRANCH_FIELDS = {"OUT": "OriginatingBranchNo", "INW": "DestBranch"}
+    MAX_SQLITE_INTEGER = 2**63 - 1
+
+    def __init__(
+        self,
+        db_manager,
+        config_dir: Path,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        transaction_codes=None,
+    ):
         self.db_manager = db_manager
         self.config_dir = config_dir # Store the config_dir (which is base_path / "config")
         self.invalid_transactions = []
         self.current_file_type = None
+        self.file_name = None  # transactions do not carry it; set from the file header
+        self.branch_index = -1  # position of the current branch header in the file
+
+        # Branch totals accumulated while loading, keyed by (FileName, BranchCode)
+        self.transaction_codes = transaction_codes
+        self.branch_totals = {}
+
+        # Bulk-load buffers, flushed with executemany every batch_size rows and before
+        # each branch header, as transactions are bound with their header's position
+        self.batch_size = max(1, int(batch_size))
+        self.pending_branch_headers = []
+        self.pending_transactions = []
+        self.rows_written = 0
+        self.load_started = None
+        self.prevalidated = False  # set when OUT rows were validated before buffering
 
     def set_file_type(self, file_type):
         """Set the current file type (INW or OUT)"""
@@ -188,6 +405,7 @@ class DataInserter:
     def insert_file_header(self, cursor, prefix, header):
         # Set the current file type
         self.set_file_type(prefix)
+        self.file_name = header["FileName"]
 
         # Show warning for INW files
         if prefix == "INW":
@@ -206,17 +424,21 @@ class DataInserter:
             header["BankCode"],
             header["NoOfBatches"],
             header["NoOfTransactions"],
-            " " * 155,
+            FILE_HEADER.blank(),
             header["FileName"],
         )
         cursor.execute(query, params)
 
-    def insert_branch_header(self, cursor, prefix, header):
-        query = f"""
+    @staticmethod
+    def _branch_header_query(prefix):
+        return f"""
         INSERT INTO {prefix}_BranchHeader (BranchControlId, FieldId, FileDate, BankCode, BranchCode, CreditTotal, NumCreditItems, DebitTotal, NumDebitItems, AccountHashTotal, Blank, FileName)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
-        params = (
+
+    @staticmethod
+    def _branch_header_params(header):
+        return (
             header["BranchControlId"],
             header["FieldId"],
             header["Date"],
@@ -227,21 +449,44 @@ class DataInserter:
             header["DebitTotal"],
             header["NoOfDebitItems"],
             header["HashTotal"],
-            " " * 101,
+            BRANCH_HEADER.blank(),
             header["FileName"],
         )
-        cursor.execute(query, params)
 
-    def validate_transaction(self, record):
+    def insert_branch_header(self, cursor, prefix, header):
+        self.branch_index += 1
+        cursor.execute(
+            self._branch_header_query(prefix), self._branch_header_params(header)
+        )
+
+    @staticmethod
+    def validate_transaction(record):
         def is_valid_account(acc):
             acc_stripped = acc.strip()
             # Check if account is only numeric characters
             return acc_stripped.isdigit()
 
-        return is_valid_account(record["DestAccount"]) and is_valid_account(
-            record["OriginatingAccountNo"]
+        return is_valid_account(record.DestAccount) and is_valid_account(
+            record.OriginatingAccountNo
         )
 
+    # Columns in TransactionRecord field order, then the per-file constants
+    @staticmethod
+    def _transaction_query(prefix):
+        return f"""
+        INSERT INTO {prefix}_Transaction (
+            Transaction_Id, Destination_Bank_No, Destination_Branch_No, Destination_Ac_No,
+            Destination_Ac_Name, Transaction_Code, Return_Code, Filler, Original_Transaction_Date,
+            Amount, Currency_Code, Originating_Bank_No, Originating_Branch_No,
+            Originating_Ac_No, Originating_Ac_Name, Particular, Reference, Value_Date,
+            Security_Check_Field, AmountInt, DestAccountInt, BranchIndex, Blank, FileName
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+
+    def _transaction_constants(self):
+        """(BranchIndex, Blank, FileName), bound after each record's own fields"""
+        return (self.branch_index, TRANSACTION.blank(), self.file_name)
+
     def insert_transaction(self, cursor, prefix, record):
         # Only validate and track invalid transactions for OUT files
         if prefix == "OUT" and (not self.validate_transaction(record)):
@@ -249,40 +494,165 @@ class DataInserter:
             return  # Skip insertion for invalid transactions in OUT files
 
         # For INW files, insert all transactions without validation
-        query = f"""
-        INSERT INTO {prefix}_Transaction (
-            Transaction_Id, Destination_Bank_No, Destination_Branch_No, Destination_Ac_No,
-            Destination_Ac_Name, Transaction_Code, Return_Code, Filler, Original_Transaction_Date,
-            Amount, Currency_Code, Originating_Bank_No, Originating_Branch_No,
-            Originating_Ac_No, Originating_Ac_Name, Particular, Reference, Value_Date,
-            Security_Check_Field, Blank, FileName, AmountInt
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        cursor.execute(self._transaction_query(prefix), record + self._transaction_constants())
+        if self.transaction_codes is not None:
+            self._accumulate(prefix, (record,))
+
+    # ---- Bulk-load path ----
+    def add_branch_header(self, cursor, prefix, header):
+        """Buffer a branch header; written on the next flush."""
+        # Buffered transactions belong to the previous header
+        if self.pending_transactions:
+            self.flush(cursor, prefix)
+        self.branch_index += 1
+
+        if self.transaction_codes is not None:
+            self.branch_totals.setdefault(
+                (header["FileName"], header["BranchCode"]), BranchTotals()
+            )
+
+        self.pending_branch_headers.append(header)
+        if len(self.pending_branch_headers) >= self.batch_size:
+            self.flush(cursor, prefix)
+
+    def add_transaction(self, cursor, prefix, record):
+        """Buffer a transaction; the buffer is validated and written once it holds batch_size rows."""
+        if self.load_started is None:
+            self.load_started = time.perf_counter()
+
+        self.pending_transactions.append(record)
+        if len(self.pending_transactions) >= self.batch_size:
+            self.flush(cursor, prefix)
+
+    def flush(self, cursor, prefix):
+        """Validate and write all buffered rows with executemany."""
+        with METRICS.stage("insert") as stage:
+            rows_before = self.rows_written
+            self._flush(cursor, prefix)
+            stage.rows += self.rows_written - rows_before
+
+    def _flush(self, cursor, prefix):
+        if self.pending_branch_headers:
+            cursor.executemany(
+                self._branch_header_query(prefix),
+                [self._branch_header_params(h) for h in self.pending_branch_headers],
+            )
+            self.pending_branch_headers = []
+
+        if not self.pending_transactions:
+            return
+
+        batch = self.pending_transactions
+        self.pending_transactions = []
+
+        # Only validate and track invalid transactions for OUT files
+        if prefix == "OUT" and not self.prevalidated:
+            valid = []
+            for record in batch:
+                if self.validate_transaction(record):
+                    valid.append(record)
+                else:
+                    self.invalid_transactions.append(record)
+            batch = valid
+
+        constants = self._transaction_constants()
+        cursor.executemany(
+            self._transaction_query(prefix), [record + constants for record in batch]
+        )
+        self.rows_written += len(batch)
+        if self.transaction_codes is not None:
+            self._accumulate(prefix, batch)
+
+    def add_batch(self, cursor, prefix, batch: TransactionBatch):
+        """Write a columnar batch of already validated transactions, binding its columns directly."""
+        if prefix == "OUT" and not self.prevalidated:
+            for record in batch.records():
+                self.add_transaction(cursor, prefix, record)
+            return
+
+        if self.load_started is None:
+            self.load_started = time.perf_counter()
+
+        with METRICS.stage("insert") as stage:
+            # Keep file order: anything buffered goes first
+            self._flush(cursor, prefix)
+            cursor.executemany(
+                self._transaction_query(prefix), batch.rows(*self._transaction_constants())
+            )
+            self.rows_written += len(batch)
+            stage.rows += len(batch)
+        if self.transaction_codes is not None:
+            self._accumulate_values(
+                prefix,
+                zip(
+                    batch.column(self.BRANCH_FIELDS[prefix]),
+                    batch.column("TransactionCode"),
+                    batch.column("Amount"),
+                    batch.column("DestAccount"),
+                ),
+            )
+
+    # ---- Branch aggregates ----
+    def _accumulate(self, prefix, records):
+        getter = attrgetter(self.BRANCH_FIELDS[prefix], "TransactionCode", "Amount", "DestAccount")
+        self._accumulate_values(prefix, map(getter, records))
+
+    def _accumulate_values(self, prefix, rows):
+        """rows: (branch, transaction code, amount, destination account) per transaction"""
+        codes = self.transaction_codes
+        totals = self.branch_totals
+        file_name = self.file_name
+        for branch_code, transaction_code, amount, dest_account in rows:
+            key = (file_name, branch_code)
+            branch = totals.get(key)
+            if branch is None:
+                branch = totals[key] = BranchTotals()
+            branch.add(transaction_code, amount, dest_account, codes)
+
+    def write_branch_aggregates(self, cursor, prefix):
+        """Store the accumulated branch totals so recreation can skip rescanning them.
+
+        A branch whose totals do not fit a SQLite INTEGER is stored as stale and
+        recomputed from the transactions at recreation time.
         """
-        params = (
-            record["TransactionId"],
-            record["DestBank"],
-            record["DestBranch"],
-            record["DestAccount"],
-            record["DestName"],
-            record["TransactionCode"],
-            record["ReturnCode"],
-            record["Filler"],
-            record["ReturnDate"],
-            record["Amount"],
-            record["Currency"],
-            record["OriginatingBankNo"],
-            record["OriginatingBranchNo"],
-            record["OriginatingAccountNo"],
-            record["OriginatorAccountName"],
-            record["Particular"],
-            record["Reference"],
-            record["ValueDate"],
-            record["SecurityCheck"],
-            " " * 30,
-            record["FileName"],
-            record["AmountInt"],
+        if not self.branch_totals or not self.db_manager.has_aggregates(cursor, prefix):
+            return
+
+        # The C/D types the totals were computed with; recreation recomputes on a mismatch
+        digest = codes_digest(self.transaction_codes)
+        rows = []
+        for (file_name, branch_code), branch in self.branch_totals.items():
+            totals = branch.totals()
+            if max(totals) > self.MAX_SQLITE_INTEGER:
+                rows.append((file_name, branch_code, 0, 0, 0, 0, 0, branch.row_count, 0, digest, 1))
+            else:
+                rows.append(
+                    (file_name, branch_code, *totals, branch.row_count,
+                     len(branch.unknown_codes), digest, 0)
+                )
+
+        with METRICS.stage("branch_aggregates") as stage:
+            stage.rows += len(rows)
+            cursor.executemany(
+                f"""
+                INSERT OR REPLACE INTO {prefix}_BranchAggregate (
+                    FileName, BranchCode, CreditTotal, NumCreditItems, DebitTotal, NumDebitItems,
+                    AccountHashTotal, NumRows, NumUnknownCodes, CodesDigest, Stale
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+        self.branch_totals = {}
+
+    def report_throughput(self):
+        if self.load_started is None:
+            return
+
+        elapsed = time.perf_counter() - self.load_started
+        rate = self.rows_written / elapsed if elapsed > 0 else 0.0
+        print(
+            f"Bulk insert: {self.rows_written} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec)"
         )
-        cursor.execute(query, params)
 
     def export_invalid_transactions(self, file_name, total_transactions_processed):
         if self.current_file_type != "OUT":
@@ -307,20 +677,19 @@ class DataInserter:
             print("No invalid transactions found for OUT file.")
             return
 
-        # Add error reasons
-        for transaction in self.invalid_transactions:
+        def error_reason(transaction):
             errors = []
-            if not transaction["DestAccount"].strip().isdigit():
+            if not transaction.DestAccount.strip().isdigit():
                 errors.append("DestAccount invalid")
-            if not transaction["OriginatingAccountNo"].strip().isdigit():
+            if not transaction.OriginatingAccountNo.strip().isdigit():
                 errors.append("OriginatingAccountNo invalid")
-            transaction["Error_Reason"] = "; ".join(errors)
+            return "; ".join(errors)
 
         try:
             with open(output_file, "w", encoding="utf-8") as txtfile:
                 # Get ValueDate from first transaction (assuming all have same ValueDate)
                 value_date = (
-                    self.invalid_transactions[0]["ValueDate"]
+                    self.invalid_transactions[0].ValueDate
                     if self.invalid_transactions
                     else ""
                 )
@@ -341,7 +710,7 @@ class DataInserter:
                     # Convert amount to decimal format (divide by 100, 2 decimal places)
                     try:
                         # Remove any non-numeric characters from amount first
-                        amount_str = transaction["Amount"].strip()
+                        amount_str = transaction.Amount.strip()
                         # Extract numeric part (remove currency symbols, etc.)
                         numeric_part = "".join(filter(str.isdigit, amount_str))
                         if numeric_part:
@@ -353,15 +722,15 @@ class DataInserter:
                         formatted_amount = "0.00"
 
                     line = (
-                        f"{transaction['OriginatingAccountNo'].strip()}\t"
-                        f"{transaction['OriginatingBranchNo'].strip()}\t\t"
+                        f"{transaction.OriginatingAccountNo.strip()}\t"
+                        f"{transaction.OriginatingBranchNo.strip()}\t\t"
                         f"{formatted_amount}\t\t"
-                        f"{transaction['DestAccount'].strip()}\t"
-                        f"{transaction['DestBank'].strip()}\t\t"
-                        f"{transaction['DestBranch'].strip()}\t\t"
-                        f"{transaction['DestName']}\t"
-                        f"{transaction['TransactionCode'].strip()}\t"
-                        f"{transaction['Error_Reason']}\n"
+                        f"{transaction.DestAccount.strip()}\t"
+                        f"{transaction.DestBank.strip()}\t\t"
+                        f"{transaction.DestBranch.strip()}\t\t"
+                        f"{transaction.DestName}\t"
+                        f"{transaction.TransactionCode.strip()}\t"
+                        f"{error_reason(transaction)}\n"
                     )
                     txtfile.write(line)
 
@@ -382,19 +751,310 @@ class DataInserter:
             print(f"ERROR: Failed to write TXT file {output_file} → {e}")
 
     def insertion_statistics(self, cursor, prefix):
-        query = (
-            f"SELECT COUNT(*), SUM(CAST(AmountInt AS BIGINT)) FROM {prefix}_Transaction"
-        )
-        cursor.execute(query)
-        result = cursor.fetchone()
-        transaction_count = result[0] or 0
-        total_amount = (result[1] or 0) / 100
+        """Rows and amount total of the file just loaded (other files may share the table)"""
+        try:
+            cursor.execute(
+                f"SELECT COUNT(*), SUM(AmountInt) FROM {prefix}_Transaction WHERE FileName = ?",
+                (self.file_name,),
+            )
+            transaction_count, amount_sum = cursor.fetchone()
+        except sqlite3.OperationalError:
+            # SUM() raises on 64-bit overflow; Python ints do not overflow
+            cursor.execute(
+                f"SELECT AmountInt FROM {prefix}_Transaction WHERE FileName = ?", (self.file_name,)
+            )
+            transaction_count = 0
+            amount_sum = 0
+            for (amount,) in cursor:
+                transaction_count += 1
+                if isinstance(amount, int):
+                    amount_sum += amount
+        transaction_count = transaction_count or 0
+        total_amount = (amount_sum or 0) / 100
 
         print(f"Total transactions inserted: {transaction_count}")
         print(f"Total Amount: {total_amount:.2f}")
         print("=" * 50)
 
 
+def file_type_of(header1):
+    # In database fieldId = "IN " - INWARD, "OUT" - OUTWARD
+    return "INW" if header1["FieldId"] == "IN " else "OUT"
+
+
+def validated_events(events, batch_size=DataInserter.DEFAULT_BATCH_SIZE, file_type=None):
+    """Validate and batch a file's parse events for the writer.
+
+    Header events pass through. OUT transactions that fail validation become
+    ("invalid", record) events; valid transactions are grouped into
+    ("transactions", TransactionBatch) events of up to batch_size rows, in file order.
+    file_type is taken from the file header event, or given for events that have none.
+    """
+    pending = []
+
+    for event, record in events:
+        if event == "transaction":
+            # Same rule as DataInserter: OUT accounts must be numeric
+            if file_type == "OUT" and not DataInserter.validate_transaction(record):
+                yield "invalid", record
+                continue
+            pending.append(record)
+            if len(pending) >= batch_size:
+                yield "transactions", TransactionBatch.from_records(pending)
+                pending = []
+            continue
+
+        if pending:
+            yield "transactions", TransactionBatch.from_records(pending)
+            pending = []
+        if event == "file_header":
+            file_type = file_type_of(record)
+        yield event, record
+
+    if pending:
+        yield "transactions", TransactionBatch.from_records(pending)
+
+
+class IngestionPipeline:
+    """Overlapped read -> parse/validate -> write for one input file.
+
+    A reader thread pulls raw records off disk and a parser thread turns them
+    into validated event blocks (see validated_events()); the thread iterating
+    events() is the single SQLite writer. The queues between the stages are
+    bounded, so a stage that gets ahead waits for the next one and memory stays
+    capped. An error in any stage stops the others and is raised in the writer.
+    """
+
+    QUEUE_DEPTH = 4     # blocks waiting between two stages
+    EVENT_BLOCK = 256   # events per block handed to the writer (a batch always ends a block)
+    POLL_SECONDS = 0.1  # how often a blocked stage checks whether the pipeline stopped
+
+    _END = object()
+
+    def __init__(self, parser, batch_size=DataInserter.DEFAULT_BATCH_SIZE, queue_depth=QUEUE_DEPTH):
+        self.parser = parser
+        self.batch_size = batch_size
+        self.queue_depth = max(1, int(queue_depth))
+        self.file_type = None  # set once the parser has seen the file header
+        self._stopped = threading.Event()
+        self._parsed = threading.Event()
+        self._errors = []
+        self._threads = []
+
+    # ---- queue helpers ----
+    def _put(self, q, item, done=None):
+        """Put with backpressure; gives up once the pipeline (or the stage fed by q) has stopped"""
+        while not (self._stopped.is_set() or (done is not None and done.is_set())):
+            try:
+                q.put(item, timeout=self.POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=self.POLL_SECONDS)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    return self._END
+
+    def _fail(self, stage, error):
+        print(f"ERROR: ingestion {stage} stage failed → {error}")
+        self._errors.append(error)
+        self._stopped.set()
+
+    # ---- stages ----
+    def _read(self, file_path, raw_queue):
+        try:
+            block_size = self.parser.READ_CHUNK_RECORDS
+            with open(file_path, "r", encoding="utf-8") as f:
+                block = []
+                for line in self.parser.iter_raw_records(f):
+                    block.append(line)
+                    if len(block) >= block_size:
+                        if not self._put(raw_queue, block, self._parsed):
+                            return
+                        block = []
+                if block:
+                    self._put(raw_queue, block, self._parsed)
+        except Exception as e:
+            self._fail("reader", e)
+        finally:
+            self._put(raw_queue, self._END, self._parsed)
+
+    def _lines(self, raw_queue):
+        while True:
+            block = self._get(raw_queue)
+            if block is self._END:
+                return
+            yield from block
+
+    def _parse(self, file_name, raw_queue, event_queue):
+        try:
+            events = self.parser.iter_line_events(self._lines(raw_queue), file_name)
+            block = []
+            for event in validated_events(events, self.batch_size):
+                if event[0] == "file_header":
+                    self.file_type = file_type_of(event[1])
+                block.append(event)
+                if event[0] == "transactions" or len(block) >= self.EVENT_BLOCK:
+                    if not self._put(event_queue, block):
+                        return
+                    block = []
+            if block:
+                self._put(event_queue, block)
+        except Exception as e:
+            self._fail("parser", e)
+        finally:
+            # The parser stops at the end of the first file header group; release the reader
+            self._parsed.set()
+            self._put(event_queue, self._END)
+
+    # ---- writer side ----
+    def events(self, file_path):
+        """Parse events for file_path, in file order, produced by the reader and parser threads"""
+        raw_queue = queue.Queue(self.queue_depth)
+        event_queue = queue.Queue(self.queue_depth)
+        self._threads = [
+            threading.Thread(target=self._read, args=(file_path, raw_queue), daemon=True),
+            threading.Thread(
+                target=self._parse, args=(file_path.name, raw_queue, event_queue), daemon=True
+            ),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        try:
+            while True:
+                block = self._get(event_queue)
+                if self._errors:
+                    raise self._errors[0]
+                if block is self._END:
+                    return
+                yield from block
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop every stage and wait for the threads to exit"""
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+
+
+class SegmentParser:
+    """Parse one large file's branch segments in worker processes.
+
+    A RecordScanner pass over the memory-mapped file notes where each branch
+    header starts; nothing is decoded or copied. Consecutive branches are
+    grouped into byte ranges, and each worker opens the file itself, reads only
+    its range and returns validated event blocks (see validated_events()).
+    Blocks are handed on in file order, so the events are the same as a serial
+    parse. Byte offsets only line up with records in a single-line ASCII file:
+    anything else, and files too small to be worth it, is parsed serially.
+    """
+
+    MIN_FILE_BYTES = 32 << 20  # smaller files are parsed serially
+    RANGE_BYTES = 4 << 20      # branches are grouped into ranges of about this size
+    CHECK_BYTES = 64 << 20     # block size for the ASCII / line break check
+    AHEAD = 2                  # ranges parsed ahead of the writer, per worker
+
+    def __init__(self, parser, workers=None, batch_size=DataInserter.DEFAULT_BATCH_SIZE):
+        self.parser = parser
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.file_type = None  # set once the file header has been read
+        self._pool = None
+
+    def index(self, file_path):
+        """(file header record, [(start, end) byte ranges of branches]), or None to parse serially"""
+        size = os.path.getsize(file_path)
+        if size < self.MIN_FILE_BYTES:
+            return None
+
+        with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            while size and data[size - 1] in b"\r\n":
+                size -= 1
+            for pos in range(0, size, self.CHECK_BYTES):
+                block = data[pos : min(pos + self.CHECK_BYTES, size)]
+                if not block.isascii() or b"\n" in block or b"\r" in block:
+                    print(f"Note: {file_path.name} is not a single-line ASCII file; parsing it serially.")
+                    return None
+
+            scanner = RecordScanner(data)  # raises RecordFormatError like the serial parser
+            header = scanner.find(FILE_HEADER_MARKER)
+            if header is None:
+                return None
+            stop = scanner.find(FILE_HEADER_MARKER, header + 1)  # only the first group is read
+            if stop is None:
+                stop = len(scanner)
+
+            header_line = scanner.record(header).decode("ascii")
+            branches = [scanner.offset(i) for i in scanner.indices(BRANCH_HEADER_MARKER, header + 1, stop)]
+            end = scanner.offset(stop)
+
+        ranges = []
+        for start, stop in zip(branches, branches[1:] + [end]):
+            if ranges and stop - ranges[-1][0] <= self.RANGE_BYTES:
+                ranges[-1] = (ranges[-1][0], stop)
+            else:
+                ranges.append((start, stop))
+        return header_line, ranges
+
+    def events(self, file_path):
+        """Validated parse events for file_path, in file order"""
+        index = self.index(file_path) if self.workers > 1 else None
+        if index is None:
+            with open(file_path, "r", encoding="utf-8") as f:
+                events = self.parser.iter_events(f, file_path.name)
+                for event in validated_events(events, self.batch_size):
+                    if event[0] == "file_header":
+                        self.file_type = file_type_of(event[1])
+                    yield event
+            return
+
+        header_line, ranges = index
+        header1 = self.parser.parse_header1(header_line, file_path.name)
+        self.file_type = file_type_of(header1)
+        yield "file_header", header1
+
+        mapper = self.parser.code_mapper
+        self._pool = ProcessPoolExecutor(
+            max_workers=min(self.workers, len(ranges) or 1),
+            initializer=_init_segment_parser,
+            initargs=(self.parser.transaction_codes, mapper),
+        )
+        try:
+            ranges = iter(ranges)
+            window = deque(
+                self._submit(file_path, start, end)
+                for start, end in islice(ranges, self.workers * self.AHEAD)
+            )
+            while window:
+                parsed = window.popleft().result()
+                for start, end in islice(ranges, 1):
+                    window.append(self._submit(file_path, start, end))
+
+                METRICS.add("parse", parsed["parse_seconds"], parsed["transactions"])
+                if mapper is not None:
+                    mapper.mapped.update(parsed["mapped"])
+                    mapper.unmapped.update(parsed["unmapped"])
+                yield from parsed["events"]
+        finally:
+            self.close()
+
+    def _submit(self, file_path, start, end):
+        return self._pool.submit(_parse_segments, file_path, start, end, self.file_type, self.batch_size)
+
+    def close(self):
+        """Stop the workers; ranges not started yet are dropped"""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
 class FileHandler:
     def __init__(self, input_dir):
         self.input_dir = input_dir
@@ -414,16 +1074,143 @@ class FileHandler:
 
 
 class SLIPSProcessor:
-    def __init__(self, config_dir: Path, input_dir: Path):
+    # "replace": wipe the prefix tables before loading (original behaviour)
+    # "append": keep earlier files; a re-sent file replaces only its own rows
+    LOAD_MODES = ("replace", "append")
+
+    def __init__(
+        self,
+        config_dir: Path,
+        input_dir: Path,
+        batch_size: int = DataInserter.DEFAULT_BATCH_SIZE,
+        load_mode: str = "replace",
+        pipelined: bool = False,
+        parse_workers: int = 1,
+    ):
+        if load_mode not in self.LOAD_MODES:
+            raise ValueError(f"Invalid load mode: {load_mode}")
+
+        self.batch_size = batch_size
+        self.load_mode = load_mode
+        # Overlap reading, parsing and writing in process() (see IngestionPipeline)
+        self.pipelined = pipelined
+        # Parse the branches of one large file in this many processes (see SegmentParser)
+        self.parse_workers = parse_workers or 1
         self.config_loader = ConfigLoader(config_dir)
         self.file_handler = FileHandler(input_dir)
-        self.parser = RecordParser(self.config_loader.transaction_codes)
+        self._parser = None
+        self._parser_mappings = None
+        self.loading_prefix = None  # type of the file being loaded, once its header is read
 
         # Use SQLite database in root directory
         root_dir = config_dir.parent  # This should be the base_path
         db_path = root_dir / "SLIPS.db"
         self.db_manager = DatabaseManager(str(db_path))
 
+    @property
+    def parser(self):
+        """RecordParser for the current config; rebuilt when a config file changes"""
+        codes = self.config_loader.transaction_codes
+        mappings = self.config_loader.code_mappings
+        if (
+            self._parser is None
+            or self._parser.transaction_codes is not codes
+            or self._parser_mappings is not mappings
+        ):
+            self._parser = RecordParser(codes, TransactionCodeMapper(codes, mappings))
+            self._parser_mappings = mappings
+        return self._parser
+
+    def _load(self, file_name, events, cleared_prefixes=None, prevalidated=False):
+        with METRICS.stage("load") as stage:
+            summary = self._load_events(file_name, events, cleared_prefixes, prevalidated)
+            if summary:
+                stage.rows += summary["transactions"]
+            return summary
+
+    def _load_events(self, file_name, events, cleared_prefixes=None, prevalidated=False):
+        """Insert one file's parse events in a single transaction.
+
+        cleared_prefixes: prefixes already cleared in this run (None clears on every file);
+        a prefix is added only once the file that cleared it has committed.
+        prevalidated: the events come from validated_events(), so OUT transactions
+        were already validated and rejected ones arrive as "invalid" events.
+        Transactions arrive one per "transaction" event, or as a TransactionBatch
+        per "transactions" event.
+        Returns a summary dict, or None if the events held no file header.
+        """
+        cursor = None
+        inserter = None
+        prefix = None
+        total_transactions = 0
+        cleared = False
+        self.loading_prefix = None
+
+        for event, record in events:
+            if event == "file_header":
+                cursor = self.db_manager.connect()
+                if not cursor:
+                    break
+
+                self.db_manager.begin()
+                inserter = DataInserter(
+                    self.db_manager,
+                    self.config_loader.config_dir,
+                    self.batch_size,
+                    self.config_loader.transaction_codes,
+                )
+                prefix = self.loading_prefix = file_type_of(record)
+                if self.load_mode == "append":
+                    self.db_manager.clear_file(cursor, prefix, file_name)
+                elif cleared_prefixes is None or prefix not in cleared_prefixes:
+                    self.db_manager.clear_tables(cursor, prefix)
+                    cleared = True
+                inserter.insert_file_header(cursor, prefix, record)
+                inserter.prevalidated = prevalidated
+            elif event == "branch_header":
+                inserter.add_branch_header(cursor, prefix, record)
+            elif event == "transactions":
+                total_transactions += len(record)
+                inserter.add_batch(cursor, prefix, record)
+            elif event == "invalid":
+                total_transactions += 1
+                inserter.invalid_transactions.append(record)
+            else:
+                total_transactions += 1  # Count total transactions
+                inserter.add_transaction(cursor, prefix, record)
+
+        if prefix is None:
+            return None
+
+        summary = {
+            "file": file_name,
+            "type": prefix,
+            "transactions": total_transactions,
+            "inserted": 0,
+            "invalid": 0,
+        }
+
+        if cursor:
+            inserter.flush(cursor, prefix)
+            inserter.write_branch_aggregates(cursor, prefix)
+            inserter.report_throughput()
+            inserter.insertion_statistics(cursor, prefix)
+            summary["inserted"] = inserter.rows_written
+            summary["invalid"] = len(inserter.invalid_transactions)
+            self.db_manager.register_file(
+                cursor, prefix, file_name, "LOADED",
+                total_transactions, summary["inserted"], summary["invalid"],
+            )
+            self.db_manager.commit_and_close()
+            # A failed load rolls the clear back, so the next file must clear again
+            if cleared and cleared_prefixes is not None:
+                cleared_prefixes.add(prefix)
+
+            # Pass total transactions count to export method
+            inserter.export_invalid_transactions(file_name, total_transactions)
+
+        return summary
+
     def process(self):
         files = self.file_handler.get_files()
 
@@ -432,53 +1219,259 @@ class SLIPSProcessor:
             return
 
         file_path = files[0]
-        with open(file_path, "r", encoding="utf-8") as f:
-            dataset = f.read()
 
-        parsed_data = self.parser.parse_dataset(dataset, file_path.name)
+        # Records are parsed and inserted as they stream off disk, so memory use
+        # does not grow with the size of the input file.
+        parser = self.parser
+        parser.code_mapper.reset_report()
+        source = None
+        if self.parse_workers > 1:
+            source = SegmentParser(parser, self.parse_workers, self.batch_size)
+        elif self.pipelined:
+            source = IngestionPipeline(parser, self.batch_size)
+        try:
+            if source is None:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    summary = self._load(file_path.name, parser.iter_events(f, file_path.name))
+            else:
+                summary = self._load(file_path.name, source.events(file_path), prevalidated=True)
+        except Exception as e:
+            # e.g. RecordFormatError for a misaligned record: nothing of the file is kept
+            print(f"ERROR: Failed to process {file_path.name} → {e}")
+            self._abort_load()
+            prefix = (source.file_type if source is not None else None) or self.loading_prefix
+            if prefix:
+                self._register_failure(file_path.name, prefix)
+            return
+        finally:
+            if source is not None:
+                source.close()
+        self.print_code_report(parser.code_mapper.report_lines(file_path.name))
 
-        if not parsed_data:
+        if summary is None:
             print("No valid data found.")
             return
 
-        cursor = self.db_manager.connect()
-
-        if cursor:
-            inserter = DataInserter(self.db_manager, self.config_loader.config_dir)
-            total_transactions = 0
+        self.file_handler.archive_file(file_path)
 
-            for group in parsed_data:
-                # In database fieldId = "IN " - INWARD
-                # In database fieldId = "OUT" - OUTWARD
-                prefix = "INW" if group["type"] == "IN " else "OUT"
-                self.db_manager.clear_tables(cursor, prefix)
-                inserter.insert_file_header(cursor, prefix, group["header1"])
+    def process_all(self, workers=None):
+        """Load every file in input/ in one run.
 
-                for branch in group["branches"]:
-                    inserter.insert_branch_header(cursor, prefix, branch["header2"])
-                    total_transactions += len(
-                        branch["data"]
-                    )  # Count total transactions
+        Files are parsed and validated in parallel worker processes; this process
+        is the single database writer and loads them in file-name order. Each
+        prefix's tables are cleared once, before its first file, so all of the
+        run's files end up side by side (in append mode nothing is cleared and each
+        file only replaces its own rows). Each file is archived as soon as it commits.
+        At most workers + 1 files are parsed ahead of the writer, so memory is
+        bounded by a few files rather than the whole input.
+        """
+        files = sorted(self.file_handler.get_files(), key=lambda f: f.name)
 
-                    for record in branch["data"]:
-                        inserter.insert_transaction(cursor, prefix, record)
+        if not files:
+            print("No files found.")
+            return []
 
-            inserter.insertion_statistics(cursor, prefix)
-            self.db_manager.commit_and_close()
+        workers = workers or min(len(files), os.cpu_count() or 1)
+        print(f"Processing {len(files)} files with {workers} parser processes...")
 
-            # Pass total transactions count to export method
-            inserter.export_invalid_transactions(file_path.name, total_transactions)
+        cleared_prefixes = set()
+        results = []
 
-        self.file_handler.archive_file(file_path)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            files_left = iter(files)
+            window = deque()  # (file, future) in file-name order
 
+            def submit(count):
+                for f in islice(files_left, count):
+                    future = pool.submit(
+                        _parse_file_for_batch, self.config_loader.config_dir, f, self.batch_size
+                    )
+                    window.append((f, future))
+
+            # A parsed file is held in memory until it is committed, so only
+            # workers + 1 files are in flight at a time
+            submit(workers + 1)
+            while window:
+                file_path, future = window.popleft()
+                print("=" * 50)
+                print(f"FILE: {file_path.name}")
+                result = {"file": file_path.name, "type": "-", "transactions": 0,
+                          "inserted": 0, "invalid": 0, "parse_seconds": 0.0,
+                          "write_seconds": 0.0, "status": "FAILED"}
+                try:
+                    parsed = future.result()
+                    result["parse_seconds"] = parsed["parse_seconds"]
+                    self.print_code_report(parsed["code_report"])
+                    METRICS.add("parse", parsed["parse_seconds"], parsed["transactions"])
+                    result["type"] = parsed["type"] or "-"
+
+                    write_started = time.perf_counter()
+                    summary = self._load(
+                        file_path.name, parsed["events"], cleared_prefixes, prevalidated=True
+                    )
+                    result["write_seconds"] = time.perf_counter() - write_started
+
+                    if summary is None:
+                        print("No valid data found.")
+                        result["status"] = "NO DATA"
+                    else:
+                        result.update(summary)
+                        self.file_handler.archive_file(file_path)
+                        result["status"] = "LOADED"
+                except Exception as e:
+                    print(f"ERROR: Failed to process {file_path.name} → {e}")
+                    self._abort_load()
+                    if result["type"] in ("INW", "OUT"):
+                        self._register_failure(file_path.name, result["type"])
+                results.append(result)
+
+                # Release this file's batches before another file is parsed
+                parsed = future = None
+                submit(1)
+
+        self.print_batch_summary(results)
+        return results
+
+    def _abort_load(self):
+        """Roll back and drop the writer connection after a failed load"""
+        if self.db_manager.conn:
+            try:
+                self.db_manager.conn.rollback()
+                self.db_manager.conn.close()
+            except sqlite3.Error:
+                pass
+            self.db_manager.conn = None
+
+    def _register_failure(self, file_name, prefix):
+        cursor = self.db_manager.connect()
+        if not cursor:
+            return
+        try:
+            self.db_manager.register_file(cursor, prefix, file_name, "FAILED")
+        finally:
+            self.db_manager.commit_and_close()
 
-def main(base_path: Path):
+    @staticmethod
+    def print_code_report(lines):
+        """Codes rewritten by transaction_codes_mapping.json and codes it could not map"""
+        if lines:
+            print("Transaction code report:")
+            for line in lines:
+                print(f"  {line}")
+
+    @staticmethod
+    def print_batch_summary(results):
+        print("=" * 90)
+        print("BATCH SUMMARY")
+        print("-" * 90)
+        print(
+            f"{'FILE':<24}{'TYPE':<6}{'TXN':>9}{'INSERTED':>10}{'INVALID':>9}"
+            f"{'PARSE(s)':>10}{'WRITE(s)':>10}  STATUS"
+        )
+        for r in results:
+            print(
+                f"{r['file']:<24}{r['type']:<6}{r['transactions']:>9}{r['inserted']:>10}"
+                f"{r['invalid']:>9}{r['parse_seconds']:>10.2f}{r['write_seconds']:>10.2f}  {r['status']}"
+            )
+        print("-" * 90)
+        print(
+            f"{'TOTAL':<30}{sum(r['transactions'] for r in results):>9}"
+            f"{sum(r['inserted'] for r in results):>10}{sum(r['invalid'] for r in results):>9}"
+        )
+        print("=" * 90)
+
+
+def _parse_file_for_batch(config_dir: Path, file_path: Path, batch_size=DataInserter.DEFAULT_BATCH_SIZE):
+    """Parse and validate one input file; runs in a worker process for process_all()"""
+    started = time.perf_counter()
+    config_loader = ConfigLoader(config_dir)
+    parser = RecordParser(config_loader.transaction_codes, config_loader.code_mapper())
+    events = []
+    file_type = None
+    transactions = 0
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        for event, record in validated_events(parser.iter_events(f, file_path.name), batch_size):
+            if event == "file_header":
+                file_type = file_type_of(record)
+            elif event == "transactions":
+                transactions += len(record)
+            elif event == "invalid":
+                transactions += 1
+            events.append((event, record))
+
+    return {
+        "type": file_type,
+        "events": events,
+        "transactions": transactions,
+        "code_report": parser.code_mapper.report_lines(file_path.name),
+        "parse_seconds": time.perf_counter() - started,
+    }
+
+
+# Per-process parser for SegmentParser workers, set up by the pool initializer
+_segment_parser = None
+
+
+def _init_segment_parser(transaction_codes, code_mapper):
+    global _segment_parser
+    _segment_parser = RecordParser(transaction_codes, code_mapper)
+
+
+def _parse_segments(file_path: Path, start: int, end: int, file_type: str, batch_size: int):
+    """Parse and validate the branches in bytes [start, end) of file_path; runs in a worker process"""
+    started = time.perf_counter()
+    parser = _segment_parser
+    if parser.code_mapper is not None:
+        parser.code_mapper.reset_report()
+
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start).decode("ascii")
+
+    lines = (data[pos : pos + RECORD_LENGTH] for pos in range(0, len(data), RECORD_LENGTH))
+    events = []
+    transactions = 0
+    for event, record in validated_events(
+        parser.iter_line_events(lines, file_path.name, in_file=True), batch_size, file_type
+    ):
+        if event == "transactions":
+            transactions += len(record)
+        elif event == "invalid":
+            transactions += 1
+        events.append((event, record))
+
+    return {
+        "events": events,
+        "transactions": transactions,
+        "mapped": parser.code_mapper.mapped if parser.code_mapper is not None else {},
+        "unmapped": parser.code_mapper.unmapped if parser.code_mapper is not None else {},
+        "parse_seconds": time.perf_counter() - started,
+    }
+
+
+def main(
+    base_path: Path,
+    process_all: bool = False,
+    workers=None,
+    load_mode: str = "replace",
+    pipelined: bool = False,
+    parse_workers: int = 1,
+):
     """Main function to be called from other files"""
     processor = SLIPSProcessor(
         base_path / "config",  # Absolute path to config folder
-        base_path / "input"    # Absolute path to input folder
+        base_path / "input",   # Absolute path to input folder
+        load_mode=load_mode,
+        pipelined=pipelined,
+        parse_workers=parse_workers,
     )
-    processor.process()
+    if process_all:
+        processor.process_all(workers)
+    else:
+        processor.process()
+
+    METRICS.write(base_path / "output", "insertion")
 
 
 if __name__ == "__main__":
@@ -486,4 +1479,10 @@ if __name__ == "__main__":
         """Helper to get base path when running outside the main application structure."""
         return Path(__file__).parent.parent 
         
-    main(get_local_base_path())
+    main(
+        get_local_base_path(),
+        process_all="--all" in sys.argv[1:],
+        load_mode="append" if "--append" in sys.argv[1:] else "replace",
+        pipelined="--pipeline" in sys.argv[1:],
+        parse_workers=os.cpu_count() if "--parallel-parse" in sys.argv[1:] else 1,
+    )
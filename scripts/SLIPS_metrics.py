@@ -0,0 +1,158 @@
+"""Lightweight per-stage run metrics shared by the insertion and recreation workflows.
+
+Each stage records wall time, rows processed, SQL statements issued, SQLite
+connections opened and the process peak memory at the end of the stage.
+Stages may nest (an outer stage includes its inner stages), and a stage
+entered several times under the same name is summed into one entry. At the
+end of a run the metrics are written as JSON to output/.
+
+    with METRICS.stage("branch_totals") as stage:
+        ...
+        stage.rows += len(pending)
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is not reported
+    resource = None
+
+
+def peak_memory_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class StageMetrics:
+    __slots__ = ("name", "calls", "seconds", "rows", "sql_statements", "connections", "peak_memory_mb")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.sql_statements = 0
+        self.connections = 0
+        self.peak_memory_mb = None
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "seconds": round(self.seconds, 4),
+            "rows": self.rows,
+            "rows_per_sec": round(self.rows / self.seconds, 1) if self.seconds > 0 and self.rows else None,
+            "sql_statements": self.sql_statements,
+            "connections": self.connections,
+            "peak_memory_mb": self.peak_memory_mb,
+        }
+
+
+class RunMetrics:
+    SLOW_STAGE_SECONDS = 60.0  # stages slower than this are listed under "slow_stages"
+    # Statement counting uses a per-statement trace callback (executemany counts every row);
+    # it costs well under a microsecond per statement but can be switched off here
+    COUNT_SQL = True
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = datetime.now()
+        self.sql_statements = 0
+        self.connections_opened = 0
+        self.stages = {}  # name -> StageMetrics, in first-entered order
+
+    # ---- counters ----
+    def _on_sql(self, statement):
+        self.sql_statements += 1
+
+    def watch(self, conn):
+        """Count the SQL statements run on conn (and the connection itself)"""
+        self.connections_opened += 1
+        if self.COUNT_SQL:
+            conn.set_trace_callback(self._on_sql)
+        return conn
+
+    # ---- stages ----
+    def _get_stage(self, name: str) -> StageMetrics:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageMetrics(name)
+        return stage
+
+    @contextmanager
+    def stage(self, name: str):
+        stage = self._get_stage(name)
+        started = time.perf_counter()
+        sql_before = self.sql_statements
+        connections_before = self.connections_opened
+        try:
+            yield stage
+        finally:
+            stage.calls += 1
+            stage.seconds += time.perf_counter() - started
+            stage.sql_statements += self.sql_statements - sql_before
+            stage.connections += self.connections_opened - connections_before
+            stage.peak_memory_mb = peak_memory_mb()
+
+    def add(self, name: str, seconds: float, rows: int = 0):
+        """Record work timed elsewhere (e.g. in a worker process) under a stage name"""
+        stage = self._get_stage(name)
+        stage.calls += 1
+        stage.seconds += seconds
+        stage.rows += rows
+
+    # ---- reporting ----
+    def as_dict(self, workflow: str) -> dict:
+        finished = datetime.now()
+        stages = [stage.as_dict() for stage in self.stages.values()]
+        return {
+            "workflow": workflow,
+            "started": self.started.isoformat(timespec="seconds"),
+            "finished": finished.isoformat(timespec="seconds"),
+            "seconds": round((finished - self.started).total_seconds(), 3),
+            "sql_statements": self.sql_statements,
+            "connections_opened": self.connections_opened,
+            "peak_memory_mb": peak_memory_mb(),
+            "stages": stages,
+            "slow_stages": [s["name"] for s in stages if s["seconds"] > self.SLOW_STAGE_SECONDS],
+        }
+
+    def write(self, output_dir: Path, workflow: str) -> Optional[Path]:
+        """Write this run's metrics to output_dir and start a new run; no-op if nothing was recorded"""
+        if not self.stages:
+            return None
+
+        data = self.as_dict(workflow)
+        # Microseconds and the pid keep runs started in the same second from overwriting each other
+        path = output_dir / f"metrics_{workflow}_{self.started:%Y%m%d_%H%M%S_%f}_{os.getpid()}.json"
+        try:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+        except OSError as e:
+            print(f"Could not write metrics file {path}: {e}")
+            return None
+        finally:
+            self.reset()
+
+        for name in data["slow_stages"]:
+            print(f"WARNING: stage '{name}' took longer than {self.SLOW_STAGE_SECONDS:.0f}s")
+        print(f"Run metrics written to {path}")
+        return path
+
+
+# One collector per process; both workflows record into it
+METRICS = RunMetrics()
@@ -0,0 +1,524 @@
+"""Fixed-width SLIP record layouts and record-level rules, shared by insertion and recreation.
+
+Every record is 180 characters. A layout lists its fields in file order as
+(name, width, numeric); offsets are derived, so adding a field is a one-line
+change. Each layout is compiled once into slice objects (for parsing) and a
+format template (for writing). TransactionRecord and TransactionBatch are the
+compact row and columnar forms of a parsed transaction, and RecordScanner
+finds the record boundaries of a whole dataset. BranchTotals holds the
+branch credit/debit and account hash total rules, so insertion and recreation
+compute them the same way, and TransactionCodeMapper applies
+transaction_codes_mapping.json while parsing.
+"""
+
+import hashlib
+from array import array
+from bisect import bisect_left
+from collections import Counter, namedtuple
+from itertools import repeat
+from operator import itemgetter
+from typing import Iterable, List, Optional, Tuple
+
+RECORD_LENGTH = 180
+
+FILE_HEADER_MARKER = "5555"
+BRANCH_HEADER_MARKER = "4444"
+TRANSACTION_MARKER = "0000"
+
+
+class Field:
+    __slots__ = ("name", "start", "width", "numeric")
+
+    def __init__(self, name: str, start: int, width: int, numeric: bool):
+        self.name = name
+        self.start = start
+        self.width = width
+        self.numeric = numeric  # right-aligned, zero-filled when written
+
+    @property
+    def end(self) -> int:
+        return self.start + self.width
+
+    def __repr__(self):
+        return f"Field({self.name!r}, {self.start}:{self.end}{', numeric' if self.numeric else ''})"
+
+
+class RecordLayout:
+    BLANK = "Blank"
+
+    def __init__(self, marker: str, fields: Iterable[Tuple[str, int, bool]]):
+        self.marker = marker
+        self.fields = []
+        start = 0
+        for name, width, numeric in fields:
+            self.fields.append(Field(name, start, width, numeric))
+            start += width
+
+        if start != RECORD_LENGTH:
+            raise ValueError(f"Layout for '{marker}' covers {start} characters, expected {RECORD_LENGTH}")
+
+        self.by_name = {f.name: f for f in self.fields}
+        self.names = tuple(f.name for f in self.fields)
+        self.slices = tuple(slice(f.start, f.end) for f in self.fields)
+
+        # Data fields are everything except the trailing padding
+        data_fields = [f for f in self.fields if f.name != self.BLANK]
+        self.data_names = tuple(f.name for f in data_fields)
+        self._data_getter = itemgetter(*(slice(f.start, f.end) for f in data_fields))
+        self._getter = itemgetter(*self.slices)
+
+        # str.format template: text is left-aligned and cut to width, numbers are zero-filled
+        self._template = "".join(
+            f"{{{i}:0>{f.width}}}" if f.numeric else f"{{{i}:<{f.width}.{f.width}}}"
+            for i, f in enumerate(self.fields)
+        )
+
+    def slice_of(self, name: str) -> slice:
+        f = self.by_name[name]
+        return slice(f.start, f.end)
+
+    def width_of(self, name: str) -> int:
+        return self.by_name[name].width
+
+    def blank(self) -> str:
+        """Padding written into the record's Blank field"""
+        return " " * self.width_of(self.BLANK) if self.BLANK in self.by_name else ""
+
+    # ---- parsing ----
+    def parse(self, line: str) -> tuple:
+        """All fields (including Blank) as a tuple of raw substrings, in layout order"""
+        return self._getter(line)
+
+    def parse_data(self, line: str) -> tuple:
+        """Data fields (no Blank) as a tuple of raw substrings, in layout order"""
+        return self._data_getter(line)
+
+    def parse_dict(self, line: str) -> dict:
+        return dict(zip(self.data_names, self._data_getter(line)))
+
+    # ---- formatting ----
+    def format(self, values: Iterable) -> str:
+        """Build a 180-char record from field values in layout order (Blank included).
+
+        None is written as an empty field. Raises ValueError if a numeric value
+        does not fit its width.
+        """
+        values = tuple(values)
+        if None in values:
+            values = tuple("" if v is None else v for v in values)
+
+        line = self._template.format(*values)
+        if len(line) != RECORD_LENGTH:
+            for f, value in zip(self.fields, values):
+                if len(str(value)) > f.width:
+                    raise ValueError(f"{f.name} value {value!r} exceeds {f.width} characters")
+            raise ValueError(f"Formatted record is {len(line)} characters, expected {RECORD_LENGTH}")
+        return line
+
+    def format_data(self, values: Iterable, blank: Optional[str] = None) -> str:
+        """Like format(), with values for the data fields only; Blank is padded"""
+        return self.format((*values, self.blank() if blank is None else blank))
+
+    # ---- compact records ----
+    def record_type(self, typename: str, extra: Tuple[str, ...] = ()):
+        """Named tuple with the data fields (no Blank) followed by the extra fields"""
+        return namedtuple(typename, self.data_names + tuple(extra), module=__name__)
+
+
+FILE_HEADER = RecordLayout(
+    FILE_HEADER_MARKER,
+    [
+        ("BankControlId", 4, False),
+        ("FieldId", 3, False),
+        ("Date", 5, False),
+        ("BankCode", 4, False),
+        ("NoOfBatches", 3, True),
+        ("NoOfTransactions", 6, True),
+        ("Blank", 155, False),
+    ],
+)
+
+BRANCH_HEADER = RecordLayout(
+    BRANCH_HEADER_MARKER,
+    [
+        ("BranchControlId", 4, False),
+        ("FieldId", 3, False),
+        ("Date", 5, False),
+        ("BankCode", 4, False),
+        ("BranchCode", 3, False),
+        ("CreditTotal", 15, True),
+        ("NoOfCreditItems", 6, True),
+        ("DebitTotal", 15, True),
+        ("NoOfDebitItems", 6, True),
+        ("HashTotal", 18, True),
+        ("Blank", 101, False),
+    ],
+)
+
+# Field order matches the *_Transaction INSERT column order
+TRANSACTION = RecordLayout(
+    TRANSACTION_MARKER,
+    [
+        ("TransactionId", 4, False),
+        ("DestBank", 4, False),
+        ("DestBranch", 3, False),
+        ("DestAccount", 12, False),
+        ("DestName", 20, False),
+        ("TransactionCode", 2, False),
+        ("ReturnCode", 2, False),
+        ("Filler", 1, False),
+        ("ReturnDate", 6, False),
+        ("Amount", 12, True),
+        ("Currency", 3, False),
+        ("OriginatingBankNo", 4, False),
+        ("OriginatingBranchNo", 3, False),
+        ("OriginatingAccountNo", 12, False),
+        ("OriginatorAccountName", 20, False),
+        ("Particular", 15, False),
+        ("Reference", 15, False),
+        ("ValueDate", 6, False),
+        ("SecurityCheck", 6, True),
+        ("Blank", 30, False),
+    ],
+)
+
+
+# Parsed transaction: the data fields plus the typed columns stored next to them.
+# A tuple costs a fraction of a dict per record; the file name and Blank padding
+# are the same for every row of a file and are bound at insert time instead.
+TransactionRecord = TRANSACTION.record_type("TransactionRecord", ("AmountInt", "DestAccountInt"))
+
+
+class TransactionBatch:
+    """Columnar form of a run of transactions: one list per TransactionRecord field.
+
+    Cheaper to pickle between processes than a list of records, and bound
+    straight into executemany() by rows(), with per-file constants repeated
+    rather than stored.
+    """
+
+    __slots__ = ("columns",)
+
+    def __init__(self, columns: List[list]):
+        self.columns = columns
+
+    @classmethod
+    def from_records(cls, records: Iterable[tuple]) -> "TransactionBatch":
+        columns = [list(column) for column in zip(*records)]
+        return cls(columns or [[] for _ in TransactionRecord._fields])
+
+    def __len__(self) -> int:
+        return len(self.columns[0])
+
+    def column(self, name: str) -> list:
+        return self.columns[TransactionRecord._fields.index(name)]
+
+    def rows(self, *constants):
+        """Row tuples in field order, each followed by the given constants"""
+        return zip(*self.columns, *map(repeat, constants))
+
+    def records(self):
+        return map(TransactionRecord._make, zip(*self.columns))
+
+
+# ---------------------- Record boundaries ----------------------
+RECORD_MARKERS = (FILE_HEADER_MARKER, BRANCH_HEADER_MARKER, TRANSACTION_MARKER)
+
+
+class RecordFormatError(ValueError):
+    """A record that does not start where the 180-character stride puts it"""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+def misaligned_record(data, pos: int, base: int = 0) -> RecordFormatError:
+    """Error for the record at data[pos:], which has no known marker.
+
+    data is str or bytes-like; base is the offset of data[0] in the file, so the
+    message gives file offsets.
+    """
+    text = isinstance(data, str)
+    markers = RECORD_MARKERS if text else tuple(m.encode("ascii") for m in RECORD_MARKERS)
+    found = data[pos : pos + 4]
+    if not text:
+        found = bytes(found).decode("ascii", "replace")
+    message = f"expected a record marker at offset {base + pos}, found {found!r}"
+
+    # The nearest marker less than a record away usually shows where the stride was lost
+    low = max(0, pos - RECORD_LENGTH + 1)
+    window = data[low : pos + RECORD_LENGTH + 3]
+    nearest = None
+    for marker in markers:
+        at = window.find(marker)
+        while at != -1:
+            if low + at != pos and (nearest is None or abs(low + at - pos) < abs(nearest - pos)):
+                nearest = low + at
+            at = window.find(marker, at + 1)
+    if nearest is not None:
+        message += f"; a marker at offset {base + nearest} is {nearest - pos:+d} characters off the stride"
+    return RecordFormatError(message, base + pos)
+
+
+class RecordScanner:
+    """Index of the records in a SLIP dataset, built in one stride-aligned pass.
+
+    Anything before the first file header (a UTF-8 BOM, leading bytes) is
+    skipped, as the streaming parser does. From there the scanner steps through
+    the data one 180-character record at a time (line breaks between records
+    are skipped, a trailing partial record is dropped) and checks only the
+    first four characters of each, so a marker inside account or amount text is
+    never taken for a record. Works on str and on bytes-like data such as an
+    mmap, where offsets are byte offsets. A record that does not start with a
+    known marker raises RecordFormatError with its offset.
+    """
+
+    MARKERS = RECORD_MARKERS
+    _UNKNOWN = len(MARKERS)
+
+    def __init__(self, data):
+        self.data = data
+        text = isinstance(data, str)
+        markers = self.MARKERS if text else tuple(m.encode("ascii") for m in self.MARKERS)
+        breaks = ("\r", "\n") if text else (b"\r", b"\n")
+
+        end = len(data)
+        while end and data[end - 1 : end] in breaks:
+            end -= 1
+
+        start = data.find(markers[0], 0, end)
+        if start == -1:
+            # No file header: nothing to parse
+            self.offsets = range(0)
+        elif all(data.find(b, start, end) == -1 for b in breaks):
+            # Single-line data: every record starts on the stride
+            self.offsets = range(start, end - (end - start) % RECORD_LENGTH, RECORD_LENGTH)
+        else:
+            self.offsets = array("q")
+            pos = start
+            while True:
+                while pos < end and data[pos : pos + 1] in breaks:
+                    pos += 1
+                if pos + RECORD_LENGTH > end:
+                    break
+                self.offsets.append(pos)
+                pos += RECORD_LENGTH
+
+        # One byte per record: its marker's index in MARKERS
+        codes = {marker: i for i, marker in enumerate(markers)}
+        self.kinds = bytes(codes.get(data[pos : pos + 4], self._UNKNOWN) for pos in self.offsets)
+
+        unknown = self.kinds.find(self._UNKNOWN)
+        if unknown != -1:
+            raise misaligned_record(data, self.offsets[unknown])
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def offset(self, index: int) -> int:
+        """Start of record index; len(self) gives the end of the last record"""
+        if index < len(self.offsets):
+            return self.offsets[index]
+        return self.offsets[-1] + RECORD_LENGTH if self.offsets else 0
+
+    def index_at(self, offset: int) -> int:
+        """Index of the first record starting at or after offset, which must not be inside a record"""
+        index = bisect_left(self.offsets, offset)
+        if index and self.offsets[index - 1] + RECORD_LENGTH > offset:
+            start = self.offsets[index - 1]
+            raise RecordFormatError(f"offset {offset} is inside the record at offset {start}", offset)
+        return index
+
+    def record(self, index: int):
+        pos = self.offsets[index]
+        return self.data[pos : pos + RECORD_LENGTH]
+
+    def marker(self, index: int) -> str:
+        return self.MARKERS[self.kinds[index]]
+
+    def find(self, marker: str, start: int = 0, stop: Optional[int] = None) -> Optional[int]:
+        """Index of the next record with this marker in [start, stop), or None"""
+        index = self.kinds.find(self.MARKERS.index(marker), start, len(self) if stop is None else stop)
+        return None if index == -1 else index
+
+    def indices(self, marker: str, start: int = 0, stop: Optional[int] = None) -> List[int]:
+        found = []
+        index = self.find(marker, start, stop)
+        while index is not None:
+            found.append(index)
+            index = self.find(marker, index + 1, stop)
+        return found
+
+    def run_end(self, start: int, marker: str) -> int:
+        """Index after the contiguous run of records with this marker starting at start"""
+        kind = self.MARKERS.index(marker)
+        kinds = self.kinds
+        index = start
+        while index < len(kinds) and kinds[index] == kind:
+            index += 1
+        return index
+
+
+# ---------------------- Branch totals ----------------------
+ZERO_AMOUNTS = ("0", "000000000000")
+
+
+def amount_value(amount) -> int:
+    """Amount as an int, with the same fallbacks the branch totals have always used"""
+    try:
+        if amount is None:
+            return 0
+        if isinstance(amount, str):
+            return int(amount.strip()) if amount.strip() else 0
+        if isinstance(amount, int):
+            return amount
+        if isinstance(amount, float):
+            return int(amount)
+        return 0
+    except (ValueError, TypeError):
+        return 0
+
+
+def amount_int(amount) -> Optional[int]:
+    """Typed AmountInt column value: the amount as an int, None if it is not numeric"""
+    try:
+        return int(amount)
+    except (ValueError, TypeError):
+        return None
+
+
+def account_hash_value(dest_account) -> int:
+    """Numeric part of a destination account, as added into the account hash total"""
+    try:
+        if dest_account and isinstance(dest_account, str):
+            account_numeric = "".join(filter(str.isdigit, dest_account))
+            if account_numeric:
+                return int(account_numeric)
+    except (ValueError, TypeError):
+        pass
+    return 0
+
+
+def codes_digest(transaction_codes: dict) -> str:
+    """Digest of the code -> C/D type table that branch totals are computed with.
+
+    Stored with each branch aggregate; when it no longer matches the current
+    transaction_codes.json the aggregate is recomputed. Descriptions are ignored.
+    """
+    types = sorted(
+        (str(code), str(info.get("type", "")).upper() if isinstance(info, dict) else "")
+        for code, info in transaction_codes.items()
+    )
+    return hashlib.sha256(repr(types).encode("utf-8")).hexdigest()
+
+
+class BranchTotals:
+    """Running credit/debit totals, counts and account hash total for one branch.
+
+    Rows with a zero amount ('0' or '000000000000') are skipped; every other row
+    adds to the hash total and, by its transaction code type (C/D), to the credit
+    or debit side. Codes missing from transaction_codes.json are collected.
+    """
+
+    __slots__ = (
+        "credit_total", "credit_count", "debit_total", "debit_count",
+        "hash_total", "row_count", "unknown_codes",
+    )
+
+    def __init__(self):
+        self.credit_total = 0
+        self.credit_count = 0
+        self.debit_total = 0
+        self.debit_count = 0
+        self.hash_total = 0
+        self.row_count = 0  # every row, zero amounts included
+        self.unknown_codes = set()
+
+    def add(self, transaction_code, amount, dest_account, codes: dict):
+        self.row_count += 1
+        if amount in ZERO_AMOUNTS:
+            return
+
+        amount_int = amount_value(amount)
+        self.hash_total += account_hash_value(dest_account)
+
+        code_str = str(transaction_code).strip() if transaction_code else ""
+        if code_str in codes:
+            tx_type = codes[code_str].get("type", "").upper()
+            if tx_type == "C":
+                self.credit_total += amount_int
+                self.credit_count += 1
+            elif tx_type == "D":
+                self.debit_total += amount_int
+                self.debit_count += 1
+        elif code_str:
+            self.unknown_codes.add(code_str)
+
+    def totals(self) -> Tuple[int, int, int, int, int]:
+        """(credit_total, credit_count, debit_total, debit_count, hash_total)"""
+        return (
+            self.credit_total, self.credit_count,
+            self.debit_total, self.debit_count,
+            self.hash_total,
+        )
+
+
+# ---------------------- Transaction codes ----------------------
+class TransactionCodeMapper:
+    """transaction_codes_mapping.json compiled into an old -> new lookup.
+
+    Only codes missing from transaction_codes.json are mapped, so a mapping can
+    never rewrite a valid code. Every mapped and unmappable code is counted for
+    the per-file report.
+    """
+
+    def __init__(self, transaction_codes: dict, mappings: dict):
+        self.known = frozenset(transaction_codes)
+        self.width = width = TRANSACTION.width_of("TransactionCode")
+        self.lookup = {}
+        for entry in mappings.values():
+            old_code = str(entry.get("old", "")).strip()
+            new_code = str(entry.get("new", "")).strip()
+            if not old_code or not new_code:
+                continue
+            old_code, new_code = old_code.zfill(width), new_code.zfill(width)
+            if old_code not in self.known:
+                self.lookup[old_code] = new_code
+        self.reset_report()
+
+    def reset_report(self):
+        self.mapped = Counter()    # (old, new) -> rows
+        self.unmapped = Counter()  # code -> rows
+
+    def map(self, code: str) -> str:
+        if code in self.known:
+            return code
+
+        stripped = code.strip()
+        if not stripped:
+            return code
+
+        # Normalised like the lookup keys, so " 6" and "6 " are code "06"
+        padded = stripped.zfill(self.width)
+        if padded in self.known:
+            return padded
+
+        new_code = self.lookup.get(padded)
+        if new_code is None:
+            self.unmapped[padded] += 1
+            return code
+
+        self.mapped[(padded, new_code)] += 1
+        return new_code
+
+    def report_lines(self, file_name: str) -> List[str]:
+        lines = []
+        for (old_code, new_code), rows in sorted(self.mapped.items()):
+            lines.append(f"{file_name}: mapped code '{old_code}' -> '{new_code}' on {rows} transactions")
+        for code, rows in sorted(self.unmapped.items()):
+            lines.append(
+                f"{file_name}: WARNING unknown code '{code}' on {rows} transactions "
+                "(not in transaction_codes.json or transaction_codes_mapping.json)"
+            )
+        return lines
@@ -1,10 +1,33 @@
-from datetime import datetime, timedelta, time
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta, time
 from pathlib import Path
 from typing import Optional, Tuple, List, Any
-import time as sleep_time
-import json
-import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, groupby
+from operator import itemgetter
+import time as clock
+import atexit
+import os
 import sqlite3
+import threading
+
+from SLIPS_config import CONFIG
+from SLIPS_metrics import METRICS
+from SLIPS_records import (
+    BRANCH_HEADER,
+    FILE_HEADER,
+    TRANSACTION,
+    BranchTotals,
+    account_hash_value,
+    amount_value,
+    codes_digest,
+)
+
+try:
+    import numpy as np
+except ImportError:  # optional: without NumPy those branches use the pure-Python scan
+    np = None
 
 
 # ---------------------- Settings & Configuration ----------------------
@@ -13,6 +36,9 @@ class Settings:
     CUTOFF_TIME = time(15, 0)  # 3 PM cutoff for next working date
     BANK_PW = "68771968"
     LANKA_CLEAR_PW = "10901939"
+    BRANCH_TOTALS_MODE = "set_based"  # "set_based" (one ordered scan) or "per_branch"
+    SECURITY_WORKERS = 1  # >1 computes security fields in a process pool
+    NUMPY_BRANCH_TOTALS = True  # use NumPy (if installed) for branch totals SQL cannot answer
 
     # SQLite database path - should be in root directory
     @staticmethod
@@ -27,54 +53,140 @@ class Settings:
         return Settings.BASE_PATH / "SLIPS.db"
 
     @staticmethod
-    def path_config(filename: str) -> Path:
+    def config_dir() -> Path:
         if Settings.BASE_PATH is None:
             raise RuntimeError("Settings.BASE_PATH must be initialized via initialize_paths()")
-        return Settings.BASE_PATH / "config" / filename
+        return Settings.BASE_PATH / "config"
 
     @staticmethod
-    def load_json(path: Path) -> dict:
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            print(f"Error: JSON file '{path}' not found.")
-            return {}
-        except json.JSONDecodeError as e:
-            print(f"Error: Invalid JSON in '{path}': {e}")
-            return {}
+    def path_config(filename: str) -> Path:
+        return Settings.config_dir() / filename
+
+    @staticmethod
+    def path_output(filename: str) -> Path:
+        if Settings.BASE_PATH is None:
+            raise RuntimeError("Settings.BASE_PATH must be initialized via initialize_paths()")
+        return Settings.BASE_PATH / "output" / filename
 
 
 # ---------------------- Database Layer ----------------------
+class PooledConnection:
+    """Lease on a shared connection; close() hands it back instead of closing it."""
+
+    def __init__(self, conn: sqlite3.Connection, key):
+        self._conn = conn
+        self._key = key
+        self._released = False
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            Database.release(self._key)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        # Like sqlite3.Connection: commit/rollback on exit. Returns the lease, so
+        # close() inside the block still hands the connection back
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+
 class Database:
+    # One configured connection per (thread, database file), reused across stages
+    _lock = threading.Lock()
+    _connections = {}
+    _leases = {}
+    connections_opened = 0
+    connections_reused = 0
+
     @staticmethod
-    def get_connection():
-        db_path = Path(Settings.get_db_path())
+    def _open_connection(db_path: Path):
+        # Timeout helps avoid "database locked" by giving time for other writes to finish.
+        conn = sqlite3.connect(
+            str(db_path),
+            timeout=10,            # waits up to 10s before throwing "database locked"
+            isolation_level=None,  # explicit transactions, no auto-commit locks
+            check_same_thread=False  # safe for threads if you grow into that
+        )
+        METRICS.watch(conn)  # count statements for the run metrics
 
-        try:
-            # Timeout helps avoid "database locked" by giving time for other writes to finish.
-            conn = sqlite3.connect(
-                str(db_path),
-                timeout=10,            # waits up to 10s before throwing "database locked"
-                isolation_level=None,  # explicit transactions, no auto-commit locks
-                check_same_thread=False  # safe for threads if you grow into that
-            )
+        # Enable WAL mode (best for concurrent reads + writes)
+        conn.execute("PRAGMA journal_mode = WAL")
 
-            # Enable WAL mode (best for concurrent reads + writes)
-            conn.execute("PRAGMA journal_mode = WAL")
+        # Foreign keys ON always recommended
+        conn.execute("PRAGMA foreign_keys = ON")
 
-            # Foreign keys ON always recommended
-            conn.execute("PRAGMA foreign_keys = ON")
+        # Synchronous NORMAL = faster writes, still safe for WAL
+        conn.execute("PRAGMA synchronous = NORMAL")
 
-            # Synchronous NORMAL = faster writes, still safe for WAL
-            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    @staticmethod
+    def get_connection():
+        db_path = Path(Settings.get_db_path())
+        key = (threading.get_ident(), str(db_path))
+
+        try:
+            with Database._lock:
+                conn = Database._connections.get(key)
+                if conn is None:
+                    conn = Database._open_connection(db_path)
+                    Database._connections[key] = conn
+                    Database.connections_opened += 1
+                else:
+                    Database.connections_reused += 1
+                Database._leases[key] = Database._leases.get(key, 0) + 1
 
-            return conn
+            return PooledConnection(conn, key)
 
         except Exception as e:
             print(f"[DB ERROR] Failed establishing DB connection: {e}")
             return None
 
+    @staticmethod
+    def release(key):
+        """Return a lease; the last lease rolls back anything its stage left uncommitted."""
+        with Database._lock:
+            leases = Database._leases.get(key, 0) - 1
+            Database._leases[key] = max(leases, 0)
+            conn = Database._connections.get(key)
+
+        if leases <= 0 and conn is not None and conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+
+    @staticmethod
+    def stats() -> dict:
+        with Database._lock:
+            return {
+                "connections_opened": Database.connections_opened,
+                "connections_reused": Database.connections_reused,
+                "connections_open": len(Database._connections),
+            }
+
+    @staticmethod
+    def close_all():
+        """Close every pooled connection (also runs at interpreter exit)."""
+        with Database._lock:
+            connections = list(Database._connections.values())
+            Database._connections.clear()
+            Database._leases.clear()
+
+        for conn in connections:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.close()
+            except sqlite3.Error:
+                pass
+
     @staticmethod
     def close_safely(conn, cursor=None):
         """Utility helper to close cursor and connection safely."""
@@ -92,49 +204,186 @@ class Database:
 
     @staticmethod
     def reset_pooling():
-        """
-        Dummy function if your app previously used pooling.
-        Now pooling is unnecessary with SQLite + WAL,
-        but you may keep this for backward-compatibility.
-        """
-        pass
+        """Drop all pooled connections; the next get_connection() opens fresh ones."""
+        Database.close_all()
+
+
+atexit.register(Database.close_all)
+
+
+def write_run_metrics() -> Optional[Path]:
+    """Write the recreation stage metrics to output/"""
+    if Settings.BASE_PATH is None:
+        return None
+    return METRICS.write(Settings.BASE_PATH / "output", "recreation")
+
+
+_run_metrics_registered = False
+
+
+def register_run_metrics():
+    """Run write_run_metrics() at interpreter exit; registered once, by main() at run start.
+
+    Not done on import, so tools and worker processes that import this module
+    never write metrics files.
+    """
+    global _run_metrics_registered
+    if not _run_metrics_registered:
+        atexit.register(write_run_metrics)
+        _run_metrics_registered = True
+
+
+# ---------------------- File scope ----------------------
+class FileScope:
+    """Restricts recreation to a chosen set of loaded files.
+
+    With no selection every row in the prefix tables is processed (original behaviour).
+    """
+    _files: Optional[Tuple[str, ...]] = None
+
+    @staticmethod
+    def select(file_names):
+        files = tuple(dict.fromkeys(file_names or ()))
+        FileScope._files = files or None
+
+    @staticmethod
+    def clear():
+        FileScope._files = None
+
+    @staticmethod
+    def selected() -> Optional[Tuple[str, ...]]:
+        return FileScope._files
+
+    @staticmethod
+    def clause(column: str = "FileName") -> Tuple[str, list]:
+        """SQL fragment (" AND column IN (...)") and params for the current selection"""
+        if not FileScope._files:
+            return "", []
+        placeholders = ",".join("?" for _ in FileScope._files)
+        return f" AND {column} IN ({placeholders})", list(FileScope._files)
+
+    @staticmethod
+    def loaded_files(table_prefix: str) -> List[Tuple[str, int, str]]:
+        """(FileName, NumInserted, TimeUpdated) of every file loaded for a prefix"""
+        conn = Database.get_connection()
+        if not conn:
+            return []
+        try:
+            return conn.execute(
+                """
+                SELECT FileName, NumInserted, TimeUpdated
+                FROM FileRegistry
+                WHERE Prefix = ? AND Status = 'LOADED'
+                ORDER BY Id
+                """,
+                (table_prefix,),
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"File registry unavailable ({e}); run init_sqlite_db.py --migrate")
+            return []
+        finally:
+            conn.close()
 
 
 # ---------------------- Transaction codes & mapping ----------------------
 class CodeMappingService:
-    def __init__(self):
-        self.transaction_codes = self._load_transaction_codes()
-        self.mappings = self._load_transaction_code_mappings()
+    """Transaction codes and mappings, read through the shared CONFIG registry"""
 
-    def _load_transaction_codes(self) -> dict:
-        path = Settings.path_config("transaction_codes.json")
-        try:
-            return Settings.load_json(path)
-        except FileNotFoundError:
-            print(f"Error: Transaction codes file '{path}' not found.")
-            return {}
-        except json.JSONDecodeError as e:
-            print(f"Error: Invalid JSON in transaction codes file: {e}")
-            return {}
-
-    def _load_transaction_code_mappings(self) -> dict:
-        path = Settings.path_config("transaction_codes_mapping.json")
+    @property
+    def transaction_codes(self) -> dict:
+        return CONFIG.transaction_codes(Settings.config_dir())
+
+    @property
+    def mappings(self) -> dict:
+        return CONFIG.code_mappings(Settings.config_dir())
+
+    def find_unknown_codes(self, cursor, table_prefix: str) -> set:
+        """Codes missing from transaction_codes.json on (scoped) non-zero transactions.
+
+        Zero-amount rows never reach the branch totals, so their codes do not matter.
+        """
+        known = list(self.transaction_codes)
+        placeholders = ", ".join("?" for _ in known)
+        scope_sql, scope_params = FileScope.clause()
+        cursor.execute(
+            f"""
+            SELECT DISTINCT Transaction_Code
+            FROM {table_prefix}_Transaction
+            WHERE Transaction_Code NOT IN ({placeholders})
+              AND Amount NOT IN ('0', '000000000000'){scope_sql}
+            """,
+            (*known, *scope_params),
+        )
+        codes = {str(row[0]).strip() for row in cursor.fetchall() if row[0]}
+        return {code for code in codes if code and code not in self.transaction_codes}
+
+    def resolve_unknown_codes(self, table_prefix: str) -> bool:
+        """Map codes left over from files loaded before parse-time mapping, once, before any totals.
+
+        New loads are mapped by the parser, so this is normally a single indexed
+        lookup that finds nothing. Returns False if unknown codes remain.
+        """
+        conn = Database.get_connection()
+        if not conn:
+            print("Failed to connect to database.")
+            return False
         try:
-            return Settings.load_json(path)
-        except FileNotFoundError:
-            print(f"Warning: Transaction codes mapping file '{path}' not found.")
-            return {}
-        except json.JSONDecodeError as e:
-            print(f"Error: Invalid JSON in transaction codes mapping file: {e}")
-            return {}
+            unknown_codes = self.find_unknown_codes(conn.cursor(), table_prefix)
+        finally:
+            conn.close()
+
+        if not unknown_codes:
+            return True
+
+        print("" + "=" * 60)
+        print("ERROR: Unknown transaction codes found:")
+        for code in sorted(unknown_codes):
+            print(f"  - Transaction Code: '{code}'")
+        print("Available mappings from transaction_codes_mapping.json:")
+        mapping = self.mappings
+        applicable = []
+        for _, m in mapping.items():
+            old_code = str(m.get("old", ""))
+            new_code = str(m.get("new", ""))
+            if old_code in unknown_codes:
+                applicable.append((old_code, new_code))
+
+        if not applicable:
+            print("No mappings found for the unknown transaction codes.")
+            print(
+                "Please update the transaction_codes.json or transaction_codes_mapping.json file and try again."
+            )
+            return False
 
-    def refresh_mappings(self):
-        self.mappings = self._load_transaction_code_mappings()
+        for old_code, new_code in applicable:
+            print(f"  - '{old_code}' -> '{new_code}'")
+        print("Do you want to update the database with these mappings?")
+        print(
+            "This will update transaction codes in the database according to the mapping file."
+        )
+        choice = (
+            input("Enter 'yes' to update and continue, or 'no' to abort: ")
+            .strip()
+            .lower()
+        )
+        if choice not in ["yes", "y"]:
+            print("Process aborted by user.")
+            return False
+
+        if not self.update_transaction_codes_in_database(unknown_codes, table_prefix):
+            print("Failed to update database. Aborting process.")
+            return False
+
+        remaining = unknown_codes - {old_code for old_code, _ in applicable}
+        if remaining:
+            print(f"No mappings for: {', '.join(sorted(remaining))}")
+            return False
+        return True
 
     def update_transaction_codes_in_database(
         self, unknown_codes: set, table_prefix: str
     ) -> bool:
-        mapping = self._load_transaction_code_mappings()
+        mapping = self.mappings
         if not mapping:
             print("No transaction code mappings found. Cannot update database.")
             return False
@@ -158,13 +407,14 @@ class CodeMappingService:
                 new_code = str(mapping_data.get("new", ""))
                 
                 if old_code and new_code and old_code in unknown_codes:
+                    scope_sql, scope_params = FileScope.clause()
                     cursor.execute(
                         f"""
                         UPDATE {table_prefix}_Transaction
                         SET Transaction_Code = ?
-                        WHERE Transaction_Code = ?
+                        WHERE Transaction_Code = ?{scope_sql}
                         """,
-                        (new_code, old_code)
+                        (new_code, old_code, *scope_params)
                     )
                     rows_affected = cursor.rowcount
                     updates_made += rows_affected
@@ -200,152 +450,237 @@ class Formatters:
 # ---------------------- Transaction analysis ----------------------
 class TransactionAnalyzer:
     def __init__(self, code_service):
-        self.codes = code_service.transaction_codes
         self.code_service = code_service
 
+    @property
+    def codes(self) -> dict:
+        return self.code_service.transaction_codes
+
+    def _codes_of_type(self, tx_type: str) -> List[str]:
+        return [
+            code for code, info in self.codes.items()
+            if info.get("type", "").upper() == tx_type
+        ]
+
+    def aggregate_branches(self, cursor, table_prefix: str, branch_field: str, file_names):
+        """Branch totals as integer SUMs over the typed AmountInt / DestAccountInt columns.
+
+        Returns (totals by (FileName, branch), keys to recompute in Python). A branch
+        is sent back to Python when it has an unknown transaction code (so the mapping
+        prompt still runs) or a row whose typed columns are missing. Raises
+        sqlite3.OperationalError on 64-bit overflow.
+        """
+        credit_codes = self._codes_of_type("C")
+        debit_codes = self._codes_of_type("D")
+        known_codes = list(self.codes)
+        marks = lambda values: ", ".join("?" for _ in values)
+
+        non_zero = "Amount NOT IN ('0', '000000000000')"
+        code = "TRIM(Transaction_Code)"
+        scope_sql, scope_params = FileScope.clause()
+        cursor.execute(
+            f"""
+            SELECT FileName, {branch_field},
+                   SUM(CASE WHEN {non_zero} AND {code} IN ({marks(credit_codes)}) THEN AmountInt ELSE 0 END),
+                   SUM(CASE WHEN {non_zero} AND {code} IN ({marks(credit_codes)}) THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN {non_zero} AND {code} IN ({marks(debit_codes)}) THEN AmountInt ELSE 0 END),
+                   SUM(CASE WHEN {non_zero} AND {code} IN ({marks(debit_codes)}) THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN {non_zero} THEN DestAccountInt ELSE 0 END),
+                   SUM(CASE WHEN {non_zero} AND (
+                           ({code} <> '' AND {code} NOT IN ({marks(known_codes)}))
+                           OR typeof(AmountInt) <> 'integer'
+                           OR typeof(DestAccountInt) <> 'integer'
+                       ) THEN 1 ELSE 0 END)
+            FROM {table_prefix}_Transaction
+            WHERE FileName IN ({marks(file_names)}){scope_sql}
+            GROUP BY FileName, {branch_field}
+            """,
+            (
+                *credit_codes, *credit_codes, *debit_codes, *debit_codes, *known_codes,
+                *file_names, *scope_params,
+            ),
+        )
+
+        totals = {}
+        fallback = set()
+        for file_name, branch_code, *values, needs_python in cursor:
+            key = (file_name, branch_code)
+            if needs_python:
+                fallback.add(key)
+            else:
+                totals[key] = tuple(values)
+        return totals, fallback
+
+    # NumPy sums are taken over high and low parts of each value so the int64
+    # partial sums stay exact; the parts are recombined as Python ints
+    NUMPY_SPLIT = 10**6
+    # Row classes for the NumPy engine
+    ROW_ZERO, ROW_CREDIT, ROW_DEBIT, ROW_OTHER, ROW_UNKNOWN = range(5)
+
+    def aggregate_branches_numpy(self, cursor, table_prefix: str, branch_field: str, file_names):
+        """Branch totals from one ordered read of the typed columns, reduced with NumPy.
+
+        Same contract as aggregate_branches(), but totals are exact at any size
+        (no 64-bit overflow) and rows whose typed columns are missing are valued
+        from their text in Python, so only branches with unknown codes are left
+        for the Python scan. Returns None if NumPy is not installed or a value is
+        too large to split safely.
+        """
+        if np is None:
+            return None
+
+        credit_codes = self._codes_of_type("C")
+        debit_codes = self._codes_of_type("D")
+        known_codes = list(self.codes)
+        marks = lambda values: ", ".join("?" for _ in values)
+        code = "TRIM(Transaction_Code)"
+        scope_sql, scope_params = FileScope.clause()
+        where = f"WHERE FileName IN ({marks(file_names)}){scope_sql}"
+        params = (*file_names, *scope_params)
+
+        conn = cursor.connection
+        snapshot = not conn.in_transaction
+        if snapshot:
+            cursor.execute("BEGIN")  # both reads see the same rows
+        try:
+            cursor.execute(
+                f"""
+                SELECT FileName, {branch_field}, COUNT(*)
+                FROM {table_prefix}_Transaction
+                {where}
+                GROUP BY FileName, {branch_field}
+                ORDER BY FileName, {branch_field}
+                """,
+                params,
+            )
+            groups = cursor.fetchall()
+            row_count = sum(count for _, _, count in groups)
+            if not row_count:
+                return {}, set()
+
+            # Five integers per row, in the same (file, branch) order as the groups
+            cursor.execute(
+                f"""
+                SELECT Id,
+                       CASE
+                           WHEN Amount IN ('0', '000000000000') THEN {self.ROW_ZERO}
+                           WHEN {code} IN ({marks(credit_codes)}) THEN {self.ROW_CREDIT}
+                           WHEN {code} IN ({marks(debit_codes)}) THEN {self.ROW_DEBIT}
+                           WHEN {code} = '' OR {code} IN ({marks(known_codes)}) THEN {self.ROW_OTHER}
+                           ELSE {self.ROW_UNKNOWN}
+                       END,
+                       typeof(AmountInt) = 'integer' AND typeof(DestAccountInt) = 'integer',
+                       CASE WHEN typeof(AmountInt) = 'integer' THEN AmountInt ELSE 0 END,
+                       CASE WHEN typeof(DestAccountInt) = 'integer' THEN DestAccountInt ELSE 0 END
+                FROM {table_prefix}_Transaction
+                {where}
+                ORDER BY FileName, {branch_field}
+                """,
+                (*credit_codes, *debit_codes, *known_codes, *params),
+            )
+            data = np.fromiter(
+                chain.from_iterable(cursor), dtype=np.int64, count=5 * row_count
+            ).reshape(row_count, 5)
+            ids, row_class, typed, amounts, accounts = data.T
+            non_zero = row_class != self.ROW_ZERO
+
+            untyped = np.flatnonzero(non_zero & (typed == 0))
+            if len(untyped):
+                # Rows loaded before the typed columns existed: value them like BranchTotals
+                position = dict(zip(ids[untyped].tolist(), untyped.tolist()))
+                cursor.execute(
+                    f"""
+                    SELECT Id, Amount, Destination_Ac_No
+                    FROM {table_prefix}_Transaction
+                    {where} AND NOT (
+                        typeof(AmountInt) = 'integer' AND typeof(DestAccountInt) = 'integer'
+                    )
+                    """,
+                    params,
+                )
+                for row_id, amount, dest_account in cursor:
+                    i = position.get(row_id)
+                    if i is None:
+                        continue
+                    amount, account = amount_value(amount), account_hash_value(dest_account)
+                    if max(abs(amount), account) > 2**63 - 1:
+                        return None
+                    amounts[i] = amount
+                    accounts[i] = account
+        finally:
+            if snapshot:
+                cursor.execute("COMMIT")
+        sizes = np.fromiter((count for _, _, count in groups), dtype=np.int64, count=len(groups))
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+        split = self.NUMPY_SPLIT
+        largest_group = int(sizes.max())
+        for values in (amounts, accounts):
+            if (int(np.abs(values).max()) // split + 1) * largest_group > 2**63 - 1:
+                return None
+
+        def counts(mask):
+            return np.add.reduceat(mask.astype(np.int64), starts).tolist()
+
+        def sums(values, mask):
+            high, low = np.divmod(values, split)
+            high = np.add.reduceat(np.where(mask, high, 0), starts).tolist()
+            low = np.add.reduceat(np.where(mask, low, 0), starts).tolist()
+            return [h * split + l for h, l in zip(high, low)]
+
+        credit = row_class == self.ROW_CREDIT
+        debit = row_class == self.ROW_DEBIT
+        needs_python = counts(row_class == self.ROW_UNKNOWN)
+
+        columns = zip(
+            sums(amounts, credit), counts(credit),
+            sums(amounts, debit), counts(debit),
+            sums(accounts, non_zero),
+        )
+        totals = {}
+        fallback = set()
+        for (file_name, branch_code, _), values, python in zip(groups, columns, needs_python):
+            key = (file_name, branch_code)
+            if python:
+                fallback.add(key)
+            else:
+                totals[key] = values
+        return totals, fallback
+
     def calculate_totals_and_hash(
         self,
         transactions: List[Tuple[str, Any, str]],
         table_prefix: str,
         bank_code: str,
         branch_code: Optional[str] = None,
+        file_name: Optional[str] = None,
     ):
-        credit_values = []
-        debit_values = []
-        hash_total = 0
-        unknown_codes = set()
-
+        branch_totals = BranchTotals()
         for transaction_code, amount, dest_account in transactions:
-            # Skip zero amounts ('0' or '000000000000')
-            if amount in ["0", "000000000000"]:
-                continue
-            # Normalize amount to int
-            try:
-                if amount is None:
-                    amount_int = 0
-                elif isinstance(amount, str):
-                    amount_int = int(amount.strip()) if amount.strip() else 0
-                elif isinstance(amount, int):
-                    amount_int = amount
-                elif isinstance(amount, float):
-                    amount_int = int(amount)
-                else:
-                    amount_int = 0
-            except (ValueError, TypeError):
-                amount_int = 0
+            branch_totals.add(transaction_code, amount, dest_account, self.codes)
 
-            # Hash total from numeric part of destination account
-            try:
-                if dest_account and isinstance(dest_account, str):
-                    account_numeric = "".join(filter(str.isdigit, dest_account))
-                    if account_numeric:
-                        hash_total += int(account_numeric)
-            except (ValueError, TypeError):
-                pass
-
-            code_str = str(transaction_code).strip() if transaction_code else ""
-            if code_str in self.codes:
-                tx_type = self.codes[code_str].get("type", "").upper()
-                if tx_type == "C":
-                    credit_values.append(amount_int)
-                elif tx_type == "D":
-                    debit_values.append(amount_int)
-            else:
-                if code_str:
-                    unknown_codes.add(code_str)
-
-        # Unknown transaction code handling (prompt + DB update + refetch)
-        if unknown_codes:
-            print("" + "=" * 60)
-            print("ERROR: Unknown transaction codes found:")
-            for code in sorted(unknown_codes):
-                print(f"  - Transaction Code: '{code}'")
-            print("Available mappings from transaction_codes_mapping.json:")
-            mapping = self.code_service._load_transaction_code_mappings()
-            applicable = []
-            for _, m in mapping.items():
-                old_code = str(m.get("old", ""))
-                new_code = str(m.get("new", ""))
-                if old_code in unknown_codes:
-                    applicable.append((old_code, new_code))
-            
-            if applicable:
-                for old_code, new_code in applicable:
-                    print(f"  - '{old_code}' -> '{new_code}'")
-                print("Do you want to update the database with these mappings?")
-                print(
-                    "This will update transaction codes in the database according to the mapping file."
-                )
-                choice = (
-                    input("Enter 'yes' to update and continue, or 'no' to abort: ")
-                    .strip()
-                    .lower()
-                )
-                if choice in ["yes", "y"]:
-                    success = self.code_service.update_transaction_codes_in_database(
-                        unknown_codes, table_prefix
-                    )
-                    if success:
-                        # For SQLite, we need to close connections to avoid locking
-                        # Database.reset_pooling()  # Remove or adjust if using SQLite
-                        sleep_time.sleep(2)  # Shorter delay for SQLite
-                        
-                        if branch_code:
-                            conn = Database.get_connection()
-                            if conn:
-                                cursor = conn.cursor()
-                                branch_field = (
-                                    "Originating_Branch_No"
-                                    if table_prefix == "OUT"
-                                    else "Destination_Branch_No"
-                                )
-                                q = f"""
-                                    SELECT Transaction_Code, Amount, Destination_Ac_No
-                                    FROM {table_prefix}_Transaction
-                                    WHERE {branch_field} = ?
-                                """
-                                cursor.execute(q, (branch_code,))
-                                updated = cursor.fetchall()
-                                conn.close()
-
-                                # RETURN SPECIAL SIGNAL TO CALLER
-                                return ("REFETCH_NEEDED", updated)
-                            else:
-                                print(
-                                    "Failed to establish new database connection for refetching"
-                                )
-                                sys.exit(1)
-                        else:
-                            print(
-                                "No branch code available for refetching. Continuing with current data."
-                            )
-                            # Even without branch code, signal that refetch is needed
-                            return ("REFETCH_NEEDED", [])
-                    else:
-                        print("Failed to update database. Aborting process.")
-                        sys.exit(1)
-                else:
-                    print("Process aborted by user.")
-                    sys.exit(1)
-            else:
-                print("No mappings found for the unknown transaction codes.")
-                print(
-                    "Please update the transaction_codes.json or transaction_codes_mapping.json file and try again."
-                )
-                sys.exit(1)
+        # Mappings are applied while parsing and by CodeMappingService.resolve_unknown_codes()
+        # before totals are computed, so an unknown code here is an error, not a retry
+        if branch_totals.unknown_codes:
+            codes = ", ".join(f"'{code}'" for code in sorted(branch_totals.unknown_codes))
+            print(f"ERROR: Unknown transaction codes in branch {branch_code} ({file_name}): {codes}")
+            return None
 
-        credit_total = sum(credit_values)
-        credit_count = len(credit_values)
-        debit_total = sum(debit_values)
-        debit_count = len(debit_values)
-        return credit_total, credit_count, debit_total, debit_count, hash_total
+        return branch_totals.totals()
 
 
 # ---------------------- Branch & Header services ----------------------
 class BranchService:
-    def __init__(self, analyzer, code_service):
+    MODE_PER_BRANCH = "per_branch"
+    MODE_SET_BASED = "set_based"
+
+    def __init__(self, analyzer, code_service, mode: Optional[str] = None):
         self.analyzer = analyzer
         self.code_service = code_service
+        self.mode = mode or Settings.BRANCH_TOTALS_MODE
+        if self.mode not in (self.MODE_PER_BRANCH, self.MODE_SET_BASED):
+            raise ValueError(f"Unknown branch totals mode: {self.mode}")
+        self.branches_found = 0
 
     @staticmethod
     def _branch_field(table_prefix: str) -> str:
@@ -355,32 +690,51 @@ class BranchService:
             else "Destination_Branch_No"
         )
 
+    @staticmethod
+    def _fetch_pending(cursor, bank_code: str, table_prefix: str):
+        """(Id, BranchCode, FileName) of pending branch headers in the current file scope"""
+        scope_sql, scope_params = FileScope.clause()
+        cursor.execute(
+            f"""
+            SELECT Id, BranchCode, FileName
+            FROM {table_prefix}_BranchHeader
+            WHERE Status = 0 AND BankCode = ?{scope_sql}
+            ORDER BY Id
+            """,
+            (bank_code, *scope_params)
+        )
+        return cursor.fetchall()
+
     def update_branch_status_and_totals(
         self, file_header_id: int, bank_code: str, table_prefix: str
     ) -> bool:
-        max_retries = 3
-        for retry in range(max_retries):
-            result = self._process_branches_with_refetch(
-                file_header_id, bank_code, table_prefix, retry
-            )
-            
-            if result is True:
-                return True
-            elif result == "COMPLETE":
-                return True
-            elif result == "REFETCH_NEEDED":
-                sleep_time.sleep(2)  # Wait for database updates to settle
-                continue
-            else:
-                return False
-        
-        print(f"Max retries ({max_retries}) exceeded")
-        return False
+        with METRICS.stage("branch_totals") as stage:
+            self.branches_found = 0
+            try:
+                return self._update_branch_status_and_totals(
+                    file_header_id, bank_code, table_prefix
+                )
+            finally:
+                stage.rows += self.branches_found
+
+    def _update_branch_status_and_totals(
+        self, file_header_id: int, bank_code: str, table_prefix: str
+    ) -> bool:
+        # Legacy rows with old codes are mapped once here; totals then take a single pass
+        if not self.code_service.resolve_unknown_codes(table_prefix):
+            return False
 
-    def _process_branches_with_refetch(
-        self, file_header_id: int, bank_code: str, table_prefix: str, attempt: int
+        process = (
+            self._process_branches_set_based
+            if self.mode == self.MODE_SET_BASED
+            else self._process_branches_per_branch
+        )
+        return process(file_header_id, bank_code, table_prefix) == "COMPLETE"
+
+    def _process_branches_per_branch(
+        self, file_header_id: int, bank_code: str, table_prefix: str
     ):
-        """Process branches with proper error handling and refetch support"""
+        """Process branches one query at a time; returns "COMPLETE" or False"""
         conn = Database.get_connection()
         if not conn:
             print("Failed to connect to database.")
@@ -390,36 +744,24 @@ class BranchService:
         
         try:
             # Fetch all pending branches
-            cursor.execute(
-                f"""
-                SELECT Id, BranchCode
-                FROM {table_prefix}_BranchHeader
-                WHERE Status = 0 AND BankCode = ?
-                ORDER BY Id
-                """,
-                (bank_code,)
-            )
-            pending = cursor.fetchall()
+            pending = self._fetch_pending(cursor, bank_code, table_prefix)
 
             if not pending:
                 print("No pending branches.")
                 return "COMPLETE"
 
+            self.branches_found = len(pending)
             print(f"Found {len(pending)} branches to process")
             branch_field = self._branch_field(table_prefix)
 
             # Process each branch
-            for branch_header_id, branch_code in pending:
+            for branch_header_id, branch_code, file_name in pending:
                 result = self._process_single_branch(
                     conn, cursor, branch_header_id, branch_code, 
-                    bank_code, table_prefix, branch_field
+                    bank_code, table_prefix, branch_field, file_name
                 )
                 
-                if result == "REFETCH_NEEDED":
-                    # Rollback any partial changes and signal refetch needed
-                    conn.rollback()
-                    return "REFETCH_NEEDED"
-                elif not result:
+                if not result:
                     # Error processing branch
                     conn.rollback()
                     return False
@@ -440,13 +782,188 @@ class BranchService:
             if conn:
                 conn.close()
 
+    def _process_branches_set_based(
+        self, file_header_id: int, bank_code: str, table_prefix: str
+    ):
+        """Compute totals for every pending branch - from stored aggregates, then
+        integer SUMs in SQL, then one ordered scan for whatever is left - and write
+        all branch header updates with a single executemany"""
+        conn = Database.get_connection()
+        if not conn:
+            print("Failed to connect to database.")
+            return False
+
+        cursor = conn.cursor()
+
+        try:
+            pending = self._fetch_pending(cursor, bank_code, table_prefix)
+
+            if not pending:
+                print("No pending branches.")
+                return "COMPLETE"
+
+            self.branches_found = len(pending)
+            print(f"Found {len(pending)} branches to process")
+            branch_field = self._branch_field(table_prefix)
+
+            pending_keys = {(file_name, branch_code) for _, branch_code, file_name in pending}
+
+            # Branches with fresh ingest-time totals skip the scan entirely
+            totals, empty = self._load_aggregates(
+                cursor, table_prefix, pending_keys, codes_digest(self.analyzer.codes)
+            )
+            remaining = pending_keys - totals.keys() - empty
+            if totals or empty:
+                print(
+                    f"Using stored totals for {len(totals) + len(empty)} branches, "
+                    f"scanning {len(remaining)}"
+                )
+
+            if remaining:
+                # Integer SUMs in SQL; only branches it cannot answer are scanned below
+                try:
+                    sql_totals, fallback = self.analyzer.aggregate_branches(
+                        cursor,
+                        table_prefix,
+                        branch_field,
+                        sorted({file_name for file_name, _ in remaining}),
+                    )
+                    totals.update(
+                        (key, value) for key, value in sql_totals.items() if key in remaining
+                    )
+                    remaining &= fallback
+                except sqlite3.OperationalError as e:
+                    print(f"SQL branch totals unavailable ({e}); computing in Python")
+
+            if remaining and Settings.NUMPY_BRANCH_TOTALS:
+                # Vectorised pass for what SQL could not answer (untyped rows, overflow)
+                try:
+                    numpy_result = self.analyzer.aggregate_branches_numpy(
+                        cursor,
+                        table_prefix,
+                        branch_field,
+                        sorted({file_name for file_name, _ in remaining}),
+                    )
+                except sqlite3.OperationalError as e:
+                    print(f"NumPy branch totals unavailable ({e}); computing in Python")
+                    numpy_result = None
+                if numpy_result is not None:
+                    numpy_totals, fallback = numpy_result
+                    totals.update(
+                        (key, value) for key, value in numpy_totals.items() if key in remaining
+                    )
+                    remaining &= fallback
+
+            if remaining:
+                # Ordered on (file, branch) so each branch's rows arrive together
+                scope_sql, scope_params = FileScope.clause()
+                files = sorted({file_name for file_name, _ in remaining})
+                file_sql = ", ".join("?" for _ in files)
+                cursor.execute(
+                    f"""
+                    SELECT FileName, {branch_field}, Transaction_Code, Amount, Destination_Ac_No
+                    FROM {table_prefix}_Transaction
+                    WHERE FileName IN ({file_sql}){scope_sql}
+                    ORDER BY FileName, {branch_field}
+                    """,
+                    (*files, *scope_params),
+                )
+            for key, rows in groupby(cursor if remaining else (), key=itemgetter(0, 1)):
+                if key not in remaining:
+                    continue
+
+                file_name, branch_code = key
+                result = self.analyzer.calculate_totals_and_hash(
+                    [row[2:] for row in rows], table_prefix, bank_code, branch_code, file_name
+                )
+                if result is None:
+                    return False
+                totals[key] = result
+
+            total_updates = []
+            status_only = []
+            for branch_header_id, branch_code, file_name in pending:
+                key = (file_name, branch_code)
+                if key in totals:
+                    total_updates.append((*totals[key], branch_header_id))
+                else:
+                    print(f"Branch {branch_code}: 0 transactions (status updated)")
+                    status_only.append((branch_header_id,))
+
+            cursor.execute("BEGIN")
+            cursor.executemany(
+                f"""
+                UPDATE {table_prefix}_BranchHeader
+                SET CreditTotal = ?, NumCreditItems = ?,
+                    DebitTotal = ?, NumDebitItems = ?,
+                    AccountHashTotal = ?, Status = 1
+                WHERE Id = ?
+                """,
+                total_updates,
+            )
+            cursor.executemany(
+                f"""
+                UPDATE {table_prefix}_BranchHeader
+                SET Status = 1
+                WHERE Id = ?
+                """,
+                status_only,
+            )
+            conn.commit()
+            return "COMPLETE"
+
+        except Exception as e:
+            print(f"Error updating branch status: {e}")
+            if conn.in_transaction:
+                conn.rollback()
+            return False
+
+        finally:
+            cursor.close()
+            conn.close()
+
+    @staticmethod
+    def _load_aggregates(cursor, table_prefix: str, pending_keys: set, digest: str):
+        """Fresh {prefix}_BranchAggregate rows for the pending branches.
+
+        Returns (totals by (FileName, BranchCode), keys of branches with no rows).
+        Stale rows, rows with unknown transaction codes and rows computed with
+        other code types (CodesDigest != digest, the current codes_digest()) are
+        left out so they are recomputed from the transactions.
+        """
+        totals = {}
+        empty = set()
+        try:
+            cursor.execute(
+                f"""
+                SELECT FileName, BranchCode, CreditTotal, NumCreditItems,
+                       DebitTotal, NumDebitItems, AccountHashTotal, NumRows
+                FROM {table_prefix}_BranchAggregate
+                WHERE Stale = 0 AND NumUnknownCodes = 0 AND CodesDigest = ?
+                """,
+                (digest,),
+            )
+        except sqlite3.OperationalError:
+            return totals, empty  # table not migrated yet
+
+        for file_name, branch_code, *values, num_rows in cursor:
+            key = (file_name, branch_code)
+            if key not in pending_keys:
+                continue
+            if num_rows:
+                totals[key] = tuple(values)
+            else:
+                empty.add(key)
+
+        return totals, empty
+
     def _process_single_branch(
         self, main_conn, main_cursor, branch_header_id: int, branch_code: str,
-        bank_code: str, table_prefix: str, branch_field: str
+        bank_code: str, table_prefix: str, branch_field: str, file_name: str
     ):
-        """Process a single branch, returns True, "REFETCH_NEEDED", or False"""
+        """Process a single branch, returns True or False"""
         try:
-            # Create new connection for this branch's transactions
+            # Nested lease on this thread's pooled connection; close() only releases it
             branch_conn = Database.get_connection()
             if not branch_conn:
                 print(f"Failed to connect for branch {branch_code}")
@@ -460,9 +977,9 @@ class BranchService:
                     f"""
                     SELECT Transaction_Code, Amount, Destination_Ac_No
                     FROM {table_prefix}_Transaction
-                    WHERE {branch_field} = ?
+                    WHERE {branch_field} = ? AND FileName = ?
                     """,
-                    (branch_code,)
+                    (branch_code, file_name)
                 )
                 transactions = branch_cursor.fetchall()
                 
@@ -481,12 +998,11 @@ class BranchService:
                     
                 # Analyze transactions
                 result = self.analyzer.calculate_totals_and_hash(
-                    transactions, table_prefix, bank_code, branch_code
+                    transactions, table_prefix, bank_code, branch_code, file_name
                 )
                 
-                # Handle REFETCH_NEEDED scenario
-                if isinstance(result, tuple) and result[0] == "REFETCH_NEEDED":
-                    return "REFETCH_NEEDED"
+                if result is None:
+                    return False
                 
                 # Normal result - update branch totals
                 credit_total, credit_count, debit_total, debit_count, hash_total = result
@@ -534,19 +1050,29 @@ class BranchInspector:
 
     def check_and_filter(
         self, bank_code: str, table_prefix: str
+    ) -> Tuple[bool, List[str], List[Any]]:
+        with METRICS.stage("branch_inspection") as stage:
+            has_problems, problems, filtered = self._check_and_filter(bank_code, table_prefix)
+            stage.rows += len(problems) + len(filtered)
+            return has_problems, problems, filtered
+
+    def _check_and_filter(
+        self, bank_code: str, table_prefix: str
     ) -> Tuple[bool, List[str], List[Any]]:
         conn = Database.get_connection()
         cursor = conn.cursor()
         try:
+            header_scope_sql, scope_params = FileScope.clause("bh.FileName")
+            scope_sql, _ = FileScope.clause()
             branch_headers_query = f"""
                 SELECT bh.Id, bh.BranchControlId, bh.FieldId, bh.FileDate, bh.BankCode,
                        bh.BranchCode, bh.CreditTotal, bh.NumCreditItems, bh.DebitTotal,
                        bh.NumDebitItems, bh.AccountHashTotal, bh.Status, bh.FileName
                 FROM {table_prefix}_BranchHeader bh
-                WHERE bh.BankCode = ?
+                WHERE bh.BankCode = ?{header_scope_sql}
                 ORDER BY bh.Id
             """
-            cursor.execute(branch_headers_query, (bank_code,))
+            cursor.execute(branch_headers_query, (bank_code, *scope_params))
             branch_headers = cursor.fetchall()
             if not branch_headers:
                 return False, [], []
@@ -554,26 +1080,28 @@ class BranchInspector:
             filtered: List[Any] = []
             branch_field = self._branch_field(table_prefix)
 
+            # One aggregate pass gives total and non-zero counts for every branch
+            counts_query = f"""
+                SELECT FileName, {branch_field},
+                       COUNT(*),
+                       SUM(CASE
+                               WHEN Amount NOT IN ('0', '000000000000')
+                                AND Amount IS NOT NULL
+                                AND Amount != ''
+                               THEN 1 ELSE 0
+                           END)
+                FROM {table_prefix}_Transaction
+                WHERE 1 = 1{scope_sql}
+                GROUP BY FileName, {branch_field}
+            """
+            cursor.execute(counts_query, scope_params)
+            branch_counts = {
+                (row[0], row[1]): (row[2], row[3]) for row in cursor.fetchall()
+            }
+
             for bh in branch_headers:
                 branch_code = bh[5]
-                count_query = f"""
-                    SELECT COUNT(*)
-                    FROM {table_prefix}_Transaction
-                    WHERE {branch_field} = ?
-                """
-                cursor.execute(count_query, (branch_code,))
-                total_count = cursor.fetchone()[0]
-
-                non_zero_query = f"""
-                    SELECT COUNT(*)
-                    FROM {table_prefix}_Transaction
-                    WHERE {branch_field} = ?
-                      AND Amount NOT IN ('0', '000000000000')
-                      AND Amount IS NOT NULL
-                      AND Amount != ''
-                """
-                cursor.execute(non_zero_query, (branch_code,))
-                non_zero_count = cursor.fetchone()[0]
+                total_count, non_zero_count = branch_counts.get((bh[12], branch_code), (0, 0))
 
                 if total_count == 0:
                     problems.append(f"Branch {branch_code} has 0 transactions")
@@ -597,6 +1125,108 @@ class BranchInspector:
 
 # ---------------------- Security Field ----------------------
 class SecurityFieldCalculator:
+    """Security Check Field generator.
+
+    compute() is the reference algorithm and re-derives everything per call.
+    An instance derives the password key schedule (C and F) once and then works
+    on integers only; it produces exactly the same 6-digit fields.
+    """
+
+    def __init__(self, bankPW: Optional[str] = None, lankaClearPW: Optional[str] = None):
+        self.bank_pw = Settings.BANK_PW if bankPW is None else bankPW
+        self.lanka_clear_pw = Settings.LANKA_CLEAR_PW if lankaClearPW is None else lankaClearPW
+        b = self._digits(self.bank_pw)
+        a = self._digits(self.lanka_clear_pw)
+        for label, pw in (("BankPW", b), ("LankaClearPW", a)):
+            if not pw or len(pw) != 8 or not pw.isdigit():
+                raise ValueError(f"{label} must be exactly 8 digits.")
+
+        a9to12 = (int(a[:4]) + int(b[4:8])) % 10_000
+        b9to12 = (int(b[:4]) + int(a[4:8])) % 10_000
+        self.C = (
+            int(a) * 10_000 + a9to12 + int(b) * 10_000 + b9to12
+        ) % 1_000_000_000_000
+        self.F = self._sum_chunks4x3(self.C) % 10_000
+
+    @staticmethod
+    def _digits(s: Optional[str]) -> str:
+        return "".join(ch for ch in (s or "") if ch.isdigit())
+
+    @staticmethod
+    def _digits_int(s: Optional[str]) -> int:
+        if not s:
+            return 0
+        if s.isdigit():
+            return int(s)
+        return int("".join(ch for ch in s if ch.isdigit()) or "0")
+
+    @staticmethod
+    def _sum_chunks4x3(value: int) -> int:
+        # value is already reduced to 12 digits
+        return value // 100_000_000 + value // 10_000 % 10_000 + value % 10_000
+
+    @staticmethod
+    def _keep_left(value: int, length: int) -> int:
+        # trunc_left() on a non-negative number: keep the leading `length` digits
+        if value < 10 ** length:
+            return value
+        return int(str(value)[:length])
+
+    def _chunk_sum(self, value: int) -> int:
+        """F * chunks(value + C), cut to 9 digits and folded into 3x3 chunks"""
+        x = self._keep_left(
+            self.F * self._sum_chunks4x3((value + self.C) % 1_000_000_000_000), 9
+        )
+        return x // 1_000_000 + x // 1_000 % 1_000 + x % 1_000
+
+    def compute_one(
+        self,
+        amount: str,
+        orgAccountNo: str,
+        desAccountNo: str,
+        des_Bank: str,
+        des_branch: str,
+        fill_a: str,
+        ret_code: str,
+        txCode: str,
+    ) -> str:
+        digits_int = self._digits_int
+        A = digits_int(amount)
+        I = digits_int(orgAccountNo)
+        J = digits_int(desAccountNo)
+        L = int((des_Bank + des_branch + ret_code + fill_a + txCode) or "0")
+
+        if L + self.C < 0:
+            # Signed input; defer to the reference string arithmetic
+            return self.compute(
+                self.bank_pw, self.lanka_clear_pw, amount, orgAccountNo,
+                desAccountNo, des_Bank, des_branch, fill_a, ret_code, txCode,
+            )
+
+        total = (
+            self._chunk_sum(A) + self._chunk_sum(I) + self._chunk_sum(J) + self._chunk_sum(L)
+        )
+        return f"{self._keep_left(total, 6):06d}"
+
+    def compute_many(self, rows, on_error=None) -> List[Optional[str]]:
+        """Compute fields for an iterable of (amount, orgAccountNo, desAccountNo,
+        des_Bank, des_branch, fill_a, ret_code, txCode) tuples.
+
+        A row that fails raises, unless on_error(row, exc) is given; the row's
+        result is then None.
+        """
+        compute_one = self.compute_one
+        results = []
+        for row in rows:
+            try:
+                results.append(compute_one(*row))
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(row, e)
+                results.append(None)
+        return results
+
     @staticmethod
     def compute(
         bankPW: str,
@@ -675,11 +1305,182 @@ class SecurityFieldCalculator:
         return trunc_left(str(R + S + T + U), 6)
 
 
+# Worker-process state for parallel security field computation
+_worker_calculator: Optional[SecurityFieldCalculator] = None
+
+
+def _init_security_worker(bank_pw: str, lanka_clear_pw: str):
+    global _worker_calculator
+    _worker_calculator = SecurityFieldCalculator(bank_pw, lanka_clear_pw)
+
+
+def _compute_security_shard(
+    db_path: str, table_prefix: str, low_id: int, high_id: int,
+    scope_sql: str = "", scope_params: Tuple = (),
+):
+    """Read one Id range read-only and return (updates, error_count); runs in a worker process"""
+    # as_uri() percent-encodes spaces, %, ? and # in the base path
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True, timeout=10)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            SELECT
+                Id,
+                Amount,
+                Originating_Ac_No,
+                Destination_Ac_No,
+                Destination_Bank_No,
+                Destination_Branch_No,
+                Filler,
+                Return_Code,
+                Transaction_Code
+            FROM {table_prefix}_Transaction
+            WHERE Id BETWEEN ? AND ?{scope_sql}
+            ORDER BY Id
+            """,
+            (low_id, high_id, *scope_params),
+        )
+        return TransactionSecurityUpdater.compute_page(_worker_calculator, cursor.fetchall())
+    finally:
+        conn.close()
+
+
 class TransactionSecurityUpdater:
-    def __init__(self, code_service: CodeMappingService):
+    PAGE_SIZE = 5000
+
+    def __init__(
+        self,
+        code_service: CodeMappingService,
+        page_size: int = PAGE_SIZE,
+        workers: Optional[int] = None,
+    ):
         self.code_service = code_service
+        self.page_size = max(1, int(page_size))
+        self.workers = max(1, int(workers or Settings.SECURITY_WORKERS))
+        self.updates_made = 0
+
+    @staticmethod
+    def _fetch_page(cursor, table_prefix: str, after_id: Optional[int], limit: int):
+        """Keyset page of security inputs ordered by Id (Id > after_id)"""
+        scope_sql, scope_params = FileScope.clause()
+        cursor.execute(
+            f"""
+            SELECT
+                Id,
+                Amount,
+                Originating_Ac_No,
+                Destination_Ac_No,
+                Destination_Bank_No,
+                Destination_Branch_No,
+                Filler,
+                Return_Code,
+                Transaction_Code
+            FROM {table_prefix}_Transaction
+            WHERE Id > ?{scope_sql}
+            ORDER BY Id
+            LIMIT ?
+            """,
+            (-1 if after_id is None else after_id, *scope_params, limit),
+        )
+        return cursor.fetchall()
+
+    @staticmethod
+    def compute_page(calculator: SecurityFieldCalculator, page) -> Tuple[List[Tuple[str, int]], int]:
+        """Return ([(security_field, Id), ...], error_count) for one page of rows"""
+        inputs = [
+            (
+                str(trans[1] or ""),    # amount
+                str(trans[2] or ""),    # originating account
+                str(trans[3] or ""),    # destination account
+                str(trans[4] or ""),    # destination bank
+                str(trans[5] or ""),    # destination branch
+                str(trans[6] or " "),   # filler
+                str(trans[7] or "00"),  # return code
+                str(trans[8] or ""),    # transaction code
+            )
+            for trans in page
+        ]
+        failures = []
+        results = calculator.compute_many(
+            inputs, on_error=lambda row, e: failures.append(e)
+        )
+
+        updates = []
+        failed = iter(failures)
+        for trans, field in zip(page, results):
+            if field is None:
+                print(
+                    f"  - Error computing security field for transaction {trans[0]}: {next(failed)}"
+                )
+            else:
+                updates.append((field, trans[0]))
+        return updates, len(failures)
+
+    def _update_parallel(self, conn, cursor, table_prefix: str, update_query: str):
+        """Shard rows by Id range across worker processes; this process is the only writer.
+
+        Shards are applied in Id order, so the result is identical to the serial path.
+        """
+        scope_sql, scope_params = FileScope.clause()
+        cursor.execute(
+            f"SELECT MIN(Id), MAX(Id) FROM {table_prefix}_Transaction WHERE 1 = 1{scope_sql}",
+            scope_params,
+        )
+        min_id, max_id = cursor.fetchone()
+        if min_id is None:
+            return 0, 0
+
+        shards = [
+            (low, min(low + self.page_size - 1, max_id))
+            for low in range(min_id, max_id + 1, self.page_size)
+        ]
+        db_path = str(Settings.get_db_path())
+        max_in_flight = self.workers * 2  # bounds results waiting for the writer
+        updates_made = 0
+        errors = 0
+
+        print(f"Computing security fields with {self.workers} worker processes...")
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_security_worker,
+            initargs=(Settings.BANK_PW, Settings.LANKA_CLEAR_PW),
+        ) as pool:
+            in_flight = deque()
+            next_shard = iter(shards)
+
+            cursor.execute("BEGIN")
+            while True:
+                while len(in_flight) < max_in_flight:
+                    shard = next(next_shard, None)
+                    if shard is None:
+                        break
+                    in_flight.append(
+                        pool.submit(
+                            _compute_security_shard, db_path, table_prefix, *shard,
+                            scope_sql, tuple(scope_params),
+                        )
+                    )
+                if not in_flight:
+                    break
+
+                updates, shard_errors = in_flight.popleft().result()
+                cursor.executemany(update_query, updates)
+                updates_made += len(updates)
+                errors += shard_errors
+            conn.commit()
+
+        return updates_made, errors
 
     def update_security_fields(self, table_prefix: str) -> bool:
+        with METRICS.stage("security_fields") as stage:
+            self.updates_made = 0
+            try:
+                return self._update_security_fields(table_prefix)
+            finally:
+                stage.rows += self.updates_made
+
+    def _update_security_fields(self, table_prefix: str) -> bool:
         conn = Database.get_connection()
         if not conn:
             return False
@@ -689,13 +1490,14 @@ class TransactionSecurityUpdater:
             placeholders = ",".join(
                 ["?" for _ in self.code_service.transaction_codes.keys()]
             )
+            scope_sql, scope_params = FileScope.clause()
             check_query = f"""
                 SELECT DISTINCT Transaction_Code
                 FROM {table_prefix}_Transaction
-                WHERE Transaction_Code NOT IN ({placeholders})
+                WHERE Transaction_Code NOT IN ({placeholders}){scope_sql}
             """
             cursor.execute(
-                check_query, list(self.code_service.transaction_codes.keys())
+                check_query, list(self.code_service.transaction_codes.keys()) + scope_params
             )
             unknown_codes_result = cursor.fetchall()
             if unknown_codes_result:
@@ -713,62 +1515,37 @@ class TransactionSecurityUpdater:
                     )
                     return False
 
-            select_query = f"""
-                SELECT
-                    Id,
-                    Amount,
-                    Originating_Ac_No,
-                    Destination_Ac_No,
-                    Destination_Bank_No,
-                    Destination_Branch_No,
-                    Filler,
-                    Return_Code,
-                    Transaction_Code
-                FROM {table_prefix}_Transaction
+            calculator = SecurityFieldCalculator()  # key schedule derived once per run
+            update_query = f"""
+                UPDATE {table_prefix}_Transaction
+                SET Security_Check_Field = ?
+                WHERE Id = ?
             """
-            cursor.execute(select_query)
-            transactions = cursor.fetchall()
-            updates_made = 0
-            errors = 0
-            for trans in transactions:
-                try:
-                    id_ = trans[0]
-                    amount = str(trans[1] or "")
-                    org_account_no = str(trans[2] or "")
-                    des_account_no = str(trans[3] or "")
-                    des_bank = str(trans[4] or "")
-                    des_branch = str(trans[5] or "")
-                    filler = str(trans[6] or " ")
-                    ret_code = str(trans[7] or "00")
-                    tx_code = str(trans[8] or "")
-
-                    security_field = SecurityFieldCalculator.compute(
-                        bankPW=Settings.BANK_PW,
-                        lankaClearPW=Settings.LANKA_CLEAR_PW,
-                        amount=amount,
-                        orgAccountNo=org_account_no,
-                        desAccountNo=des_account_no,
-                        des_Bank=des_bank,
-                        des_branch=des_branch,
-                        fill_a=filler,
-                        ret_code=ret_code,
-                        txCode=tx_code,
-                    )
-
-                    update_query = f"""
-                        UPDATE {table_prefix}_Transaction
-                        SET Security_Check_Field = ?
-                        WHERE Id = ?
-                    """
-                    cursor.execute(update_query, (security_field, id_))
-                    updates_made += 1
-                except Exception as e:
-                    print(
-                        f"  - Error computing security field for transaction {trans[0]}: {e}"
-                    )
-                    errors += 1
-                    continue
-            conn.commit()
+            if self.workers > 1:
+                updates_made, errors = self._update_parallel(
+                    conn, cursor, table_prefix, update_query
+                )
+            else:
+                updates_made = 0
+                errors = 0
+                last_id = None
+
+                # Page through the table by Id so only one page is held in memory,
+                # and write each page with executemany inside a single transaction.
+                cursor.execute("BEGIN")
+                while True:
+                    page = self._fetch_page(cursor, table_prefix, last_id, self.page_size)
+                    if not page:
+                        break
+                    last_id = page[-1][0]
+
+                    updates, page_errors = self.compute_page(calculator, page)
+                    cursor.executemany(update_query, updates)
+                    updates_made += len(updates)
+                    errors += page_errors
+
+                conn.commit()
+            self.updates_made = updates_made
             if errors > 0:
                 print(f"  - Failed to update {errors} transactions due to errors.")
             return True
@@ -781,9 +1558,102 @@ class TransactionSecurityUpdater:
 
 
 # ---------------------- Value date & cleanup (OUT) ----------------------
+class BusinessCalendar:
+    """Working days for the years covered by bank_holidays.json, precomputed once.
+
+    Working days (weekdays that are not holidays) are kept as a sorted list of
+    date ordinals, so every query is a bisect. Dates outside the covered years
+    fall back to skipping weekends only, with a warning.
+    """
+
+    _cache = {}  # config dir -> (holidays from CONFIG, calendar)
+
+    def __init__(self, holidays):
+        self.holidays = frozenset(holidays)
+        years = sorted({d.year for d in self.holidays})
+        self.first_year = years[0] if years else None
+        self.last_year = years[-1] if years else None
+        self._warned_years = set()
+
+        self._days = []
+        if years:
+            first = date(self.first_year, 1, 1).toordinal()
+            last = date(self.last_year, 12, 31).toordinal()
+            holiday_ordinals = {d.toordinal() for d in self.holidays}
+            # date.fromordinal(1) is a Monday, so (ordinal - 1) % 7 is the weekday
+            self._days = [
+                n for n in range(first, last + 1)
+                if (n - 1) % 7 < 5 and n not in holiday_ordinals
+            ]
+
+    @classmethod
+    def load(cls, config_dir: Optional[Path] = None) -> "BusinessCalendar":
+        """Calendar for bank_holidays.json, rebuilt only when the file changes"""
+        config_dir = config_dir or Settings.config_dir()
+        holidays = CONFIG.holidays(config_dir)
+        cached = cls._cache.get(str(config_dir))
+        if cached and cached[0] is holidays:
+            return cached[1]
+
+        calendar = cls(holidays)
+        cls._cache[str(config_dir)] = (holidays, calendar)
+        return calendar
+
+    def covers(self, day: date) -> bool:
+        """True if day falls in a year bank_holidays.json covers; warns (once per year) if not"""
+        if self.first_year is not None and self.first_year <= day.year <= self.last_year:
+            return True
+        if day.year not in self._warned_years:
+            self._warned_years.add(day.year)
+            covered = f"{self.first_year}-{self.last_year}" if self.first_year else "no years"
+            print(
+                f"WARNING: {day.year} is not covered by bank_holidays.json ({covered}); "
+                "only weekends are treated as non-working days."
+            )
+        return False
+
+    def is_working_day(self, day: date) -> bool:
+        if not self.covers(day):
+            return day.weekday() < 5
+        n = day.toordinal()
+        i = bisect_left(self._days, n)
+        return i < len(self._days) and self._days[i] == n
+
+    def next_working_day(self, day: date) -> date:
+        """First working day after day"""
+        return self.add_working_days(day, 1)
+
+    def add_working_days(self, day: date, count: int) -> date:
+        """The count-th working day after day (before it if count is negative); day itself if 0"""
+        if count == 0:
+            return day
+
+        if self.covers(day):
+            n = day.toordinal()
+            if count > 0:
+                i = bisect_right(self._days, n) + count - 1
+            else:
+                i = bisect_left(self._days, n) + count
+            if 0 <= i < len(self._days):
+                return date.fromordinal(self._days[i])
+
+        # The result lies outside the covered years: step day by day from there
+        step = timedelta(days=1 if count > 0 else -1)
+        remaining = abs(count)
+        while remaining:
+            day += step
+            if self.is_working_day(day):
+                remaining -= 1
+        return day
+
+
 class ValueDateService:
-    def __init__(self):
-        pass
+    def __init__(self, calendar: Optional[BusinessCalendar] = None):
+        self._calendar = calendar
+
+    @property
+    def calendar(self) -> BusinessCalendar:
+        return self._calendar or BusinessCalendar.load()
 
     def _is_valid_date(self, value_date: str) -> bool:
         if len(value_date) != 6 or not value_date.isdigit():
@@ -806,35 +1676,16 @@ class ValueDateService:
         
         return True
 
-    def _load_holidays(self) -> set:
-        path = Settings.path_config("bank_holidays.json")
-        with open(path, "r") as f:
-            data = json.load(f)
-        return {
-            datetime(item["year"], item["month"], item["day"]).date() for item in data
-        }
-
-    def _next_working_day(self, date_obj, holidays):
-        date_obj += timedelta(days=1)
-
-        while date_obj.weekday() >= 5 or date_obj in holidays:
-            date_obj += timedelta(days=1)
-
-        return date_obj
-
     def _suggested_dates(self) -> Tuple[str, str]:
-        holidays = self._load_holidays()
+        calendar = self.calendar
         now = datetime.now()
         today = now.date()
 
         # Determine value date
-        if now.time() >= Settings.CUTOFF_TIME:
-            val = self._next_working_day(today, holidays)
+        if now.time() >= Settings.CUTOFF_TIME or not calendar.is_working_day(today):
+            val = calendar.next_working_day(today)
         else:
-            if today.weekday() >= 5 or today in holidays:
-                val = self._next_working_day(today, holidays)
-            else:
-                val = today
+            val = today
 
         # Salary suggestion should be the SAME day as value date
         sal = val
@@ -858,8 +1709,8 @@ class ValueDateService:
             if self._is_valid_date(val_input):
                 break
 
-        holidays = self._load_holidays()
         value_date_obj = datetime.strptime("20" + val_input, "%Y%m%d").date()
+        self.calendar.covers(value_date_obj)
         new_salary_suggestion = value_date_obj.strftime("%y%m%d")
 
         while True:
@@ -875,3 +1726,232 @@ class ValueDateService:
 
         return val_input, sal_input
 
+
+# ---------------------- File recreation ----------------------
+class FileRecreator:
+    """Streams a loaded file back out as a single-line SLIP file in output/.
+
+    Records are formatted from the declarative layouts straight into a large
+    write buffer, one page of transactions at a time, so memory stays flat for
+    any file size. The file is written to a temporary name and renamed into
+    place only once complete.
+    """
+
+    PAGE_SIZE = 5000
+    WRITE_BUFFER = 1 << 20  # 1 MiB
+    HASH_TOTAL_WIDTH = BRANCH_HEADER.width_of("HashTotal")
+
+    def __init__(
+        self,
+        calculator: Optional[SecurityFieldCalculator] = None,
+        page_size: int = PAGE_SIZE,
+    ):
+        self.calculator = calculator or SecurityFieldCalculator()
+        self.page_size = max(1, int(page_size))
+        self.records_written = 0
+
+    @classmethod
+    def _fit_hash_total(cls, branch):
+        """Branch header row with AccountHashTotal cut to its low-order digits, or None if it fits.
+
+        The field holds the hash total modulo 10**18 (as SLIPS_generator writes it);
+        the stored total can be wider once every account in the branch is summed.
+        """
+        hash_total = str(branch[9] if branch[9] is not None else "").strip()
+        if len(hash_total) <= cls.HASH_TOTAL_WIDTH or not hash_total.isdigit():
+            return None
+        return (*branch[:9], hash_total[-cls.HASH_TOTAL_WIDTH:])
+
+    def _security_field(self, row) -> Optional[str]:
+        """Fill a missing Security_Check_Field; row is in TRANSACTION data-field order"""
+        try:
+            return self.calculator.compute_one(
+                str(row[9] or ""),   # amount
+                str(row[13] or ""),  # originating account
+                str(row[3] or ""),   # destination account
+                str(row[1] or ""),   # destination bank
+                str(row[2] or ""),   # destination branch
+                str(row[7] or " "),  # filler
+                str(row[6] or "00"), # return code
+                str(row[5] or ""),   # transaction code
+            )
+        except Exception as e:
+            print(f"  - Error computing security field for transaction {row[0]}: {e}")
+            return None
+
+    def recreate(self, table_prefix: str) -> List[Path]:
+        """Write every loaded file (restricted to FileScope) to output/<FileName>"""
+        with METRICS.stage("recreate") as stage:
+            self.records_written = 0
+            try:
+                return self._recreate(table_prefix)
+            finally:
+                stage.rows += self.records_written
+
+    def _recreate(self, table_prefix: str) -> List[Path]:
+        conn = Database.get_connection()
+        if not conn:
+            print("Failed to connect to database.")
+            return []
+
+        cursor = conn.cursor()
+        written = []
+        try:
+            scope_sql, scope_params = FileScope.clause()
+            cursor.execute(
+                f"""
+                SELECT FileName, BankControlId, FieldId, FileDate, BankCode, NumBatches, NumTransactions
+                FROM {table_prefix}_FileHeader
+                WHERE 1 = 1{scope_sql}
+                ORDER BY Id
+                """,
+                scope_params,
+            )
+            for file_name, *header in cursor.fetchall():
+                path = self.write_file(conn, table_prefix, file_name, header)
+                if path:
+                    written.append(path)
+        finally:
+            cursor.close()
+            conn.close()
+
+        return written
+
+    def write_file(self, conn, table_prefix: str, file_name: str, header) -> Optional[Path]:
+        path = Settings.path_output(file_name)
+        tmp_path = path.with_name(path.name + ".tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        started = clock.perf_counter()
+        records = 0
+        filled = 0
+        orphans = 0
+        truncated = []
+        branch_cursor = conn.cursor()
+        tx_cursor = conn.cursor()
+        try:
+            branch_cursor.execute(
+                f"""
+                SELECT BranchControlId, FieldId, FileDate, BankCode, BranchCode,
+                       CreditTotal, NumCreditItems, DebitTotal, NumDebitItems, AccountHashTotal
+                FROM {table_prefix}_BranchHeader
+                WHERE FileName = ?
+                ORDER BY Id
+                """,
+                (file_name,),
+            )
+            branches = branch_cursor.fetchall()
+
+            # Transactions grouped by the position of their branch header in the
+            # original file (BranchIndex), so headers keep their order and
+            # repeated branch codes keep their own transactions; read a page at a time
+            tx_cursor.execute(
+                f"""
+                SELECT BranchIndex,
+                       Transaction_Id, Destination_Bank_No, Destination_Branch_No, Destination_Ac_No,
+                       Destination_Ac_Name, Transaction_Code, Return_Code, Filler, Original_Transaction_Date,
+                       Amount, Currency_Code, Originating_Bank_No, Originating_Branch_No,
+                       Originating_Ac_No, Originating_Ac_Name, Particular, Reference, Value_Date,
+                       Security_Check_Field
+                FROM {table_prefix}_Transaction
+                WHERE FileName = ?
+                ORDER BY BranchIndex, Id
+                """,
+                (file_name,),
+            )
+
+            def pages():
+                while True:
+                    page = tx_cursor.fetchmany(self.page_size)
+                    if not page:
+                        return
+                    yield from page
+
+            rows = pages()
+            row = next(rows, None)
+            blank = TRANSACTION.blank()
+
+            with open(tmp_path, "w", encoding="utf-8", newline="", buffering=self.WRITE_BUFFER) as out:
+                out.write(FILE_HEADER.format_data(header))
+                records += 1
+
+                for branch_index, branch in enumerate(branches):
+                    fitted = self._fit_hash_total(branch)
+                    if fitted is not None:
+                        truncated.append(branch[4])
+                        branch = fitted
+                    out.write(BRANCH_HEADER.format_data(branch))
+                    records += 1
+
+                    # NULL sorts first: transactions with no branch header are not written
+                    while row is not None and (row[0] is None or row[0] < branch_index):
+                        orphans += 1
+                        row = next(rows, None)
+
+                    lines = []
+                    while row is not None and row[0] == branch_index:
+                        values = row[1:]
+                        if not (values[18] or "").strip():
+                            security = self._security_field(values)
+                            if security is not None:
+                                values = (*values[:18], security)
+                                filled += 1
+                        lines.append(TRANSACTION.format_data(values, blank))
+                        if len(lines) >= self.page_size:
+                            out.write("".join(lines))
+                            records += len(lines)
+                            lines = []
+                        row = next(rows, None)
+
+                    out.write("".join(lines))
+                    records += len(lines)
+
+                while row is not None:
+                    orphans += 1
+                    row = next(rows, None)
+
+                out.flush()
+                os.fsync(out.fileno())
+
+            os.replace(tmp_path, path)
+
+        except Exception as e:
+            print(f"Error writing {path.name}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return None
+
+        finally:
+            branch_cursor.close()
+            tx_cursor.close()
+
+        self.records_written += records
+        elapsed = clock.perf_counter() - started
+        size = path.stat().st_size
+        print(f"Recreated {path}")
+        print(
+            f"  {records} records, {size:,} bytes in {elapsed:.2f}s "
+            f"({records / elapsed if elapsed > 0 else 0:,.0f} records/sec, "
+            f"{size / elapsed if elapsed > 0 else 0:,.0f} bytes/sec)"
+        )
+        if filled:
+            print(f"  - Computed {filled} missing security check fields")
+        if orphans:
+            print(f"  - Skipped {orphans} transactions with no matching branch header")
+        if truncated:
+            print(
+                f"  - Account hash total of branches {', '.join(truncated)} wider than "
+                f"{self.HASH_TOTAL_WIDTH} digits; wrote its low-order digits"
+            )
+        return path
+
+
+def main(base_path: Path):
+    """Start a recreation run; called by the entry point before it runs the services.
+
+    Sets the base path and writes the run's stage metrics to output/ at exit.
+    """
+    Settings.initialize_paths(base_path)
+    register_run_metrics()
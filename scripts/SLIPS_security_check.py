@@ -0,0 +1,163 @@
+"""Differential check of the Security Check Field implementations.
+
+SecurityFieldCalculator.compute() is the reference (string arithmetic);
+compute_one() and compute_many() use the integer key schedule derived once per
+instance. This script runs all three over fixed edge cases and random inputs,
+for the configured passwords and for random and edge-case password pairs, and
+reports every input where they disagree (a different field, or one raising
+where the other does not):
+
+    python scripts/SLIPS_security_check.py
+    python scripts/SLIPS_security_check.py --rows 300000 --seed 7
+
+Exits with status 1 if any mismatch was found.
+"""
+
+import argparse
+import random
+import sys
+
+from SLIPS_recreation import SecurityFieldCalculator, Settings
+
+DEFAULT_ROWS = 50_000
+DEFAULT_PASSWORD_PAIRS = 5
+MAX_REPORTED = 20
+
+# Passwords are reduced to their digits and must leave exactly 8
+EDGE_PASSWORDS = (
+    ("00000000", "00000000"),
+    ("99999999", "99999999"),
+    ("00000001", "99999999"),
+    ("9999-9999", "0000 0001"),
+)
+
+EDGE_AMOUNTS = (
+    "", "0", "000000000000", "000000000001", "999999999999", "1000000000000",
+    "   1234", "12,345.67", "-500", "Rs 100", None,
+)
+EDGE_ACCOUNTS = (
+    "", "000000000000", "999999999999", "000000000001", "  1234567890",
+    "12-3456-789", "ABCDEFGHIJKL", "ACC000000042", "١٢٣٤٥", None,
+)
+# (des_Bank, des_branch, fill_a, ret_code, txCode)
+EDGE_CODES = (
+    ("0000", "000", "0", "00", "00"),
+    ("9999", "999", "9", "99", "99"),
+    ("7135", "001", "0", "00", "23"),
+    ("", "", "", "", ""),
+    ("-999", "999", "9", "99", "99"),      # negative L: signed fallback path
+    ("-000", "000", "0", "00", "01"),
+    ("+713", "001", "0", "00", "23"),
+    ("7135", "001", " ", "00", "23"),      # not a number: both must raise
+    ("71 5", "001", "0", "00", "23"),
+    ("7135", "001", "0", "00", "2X"),
+)
+
+
+def random_digits(rng: random.Random, low: int, high: int) -> str:
+    return "".join(rng.choice("0123456789") for _ in range(rng.randint(low, high)))
+
+
+def random_row(rng: random.Random) -> tuple:
+    def amount():
+        roll = rng.random()
+        if roll < 0.05:
+            return rng.choice(EDGE_AMOUNTS)
+        if roll < 0.10:
+            return " " * rng.randint(0, 3) + random_digits(rng, 1, 9)
+        return random_digits(rng, 12, 12)
+
+    def account():
+        roll = rng.random()
+        if roll < 0.05:
+            return rng.choice(EDGE_ACCOUNTS)
+        if roll < 0.15:
+            return "".join(rng.choice("0123456789ABC -") for _ in range(12))
+        return random_digits(rng, 1, 12).rjust(12, "0")
+
+    if rng.random() < 0.05:
+        codes = rng.choice(EDGE_CODES)
+    else:
+        codes = (
+            random_digits(rng, 4, 4), random_digits(rng, 3, 3), rng.choice("0123456789"),
+            random_digits(rng, 2, 2), random_digits(rng, 2, 2),
+        )
+    des_bank, des_branch, fill_a, ret_code, tx_code = codes
+    return (amount(), account(), account(), des_bank, des_branch, fill_a, ret_code, tx_code)
+
+
+def edge_rows():
+    for amount in EDGE_AMOUNTS:
+        for account in EDGE_ACCOUNTS:
+            for codes in EDGE_CODES:
+                des_bank, des_branch, fill_a, ret_code, tx_code = codes
+                yield (amount, account, account[::-1] if account else account,
+                       des_bank, des_branch, fill_a, ret_code, tx_code)
+
+
+def outcome(function, *args):
+    """("ok", field) or ("error", exception type name)"""
+    try:
+        return "ok", function(*args)
+    except Exception as e:
+        return "error", type(e).__name__
+
+
+def check_passwords(bank_pw: str, lanka_clear_pw: str, rows: list) -> list:
+    """Inputs where compute_one()/compute_many() disagree with compute()"""
+    mismatches = []
+    reference = outcome(SecurityFieldCalculator, bank_pw, lanka_clear_pw)
+    if reference[0] == "error":
+        # The instance must reject the same passwords as compute()
+        direct = outcome(SecurityFieldCalculator.compute, bank_pw, lanka_clear_pw, *rows[0])
+        if direct[0] != "error":
+            mismatches.append(((bank_pw, lanka_clear_pw), "constructor", reference, direct))
+        return mismatches
+
+    calculator = reference[1]
+    # compute_many() reports a failed row through on_error and returns None for it
+    many = calculator.compute_many(rows, on_error=lambda row, exc: None)
+
+    for row, batch_field in zip(rows, many):
+        expected = outcome(SecurityFieldCalculator.compute, bank_pw, lanka_clear_pw, *row)
+        one = outcome(calculator.compute_one, *row)
+        batch = ("ok", batch_field) if batch_field is not None else ("error", "compute_many")
+        if one != expected:
+            mismatches.append(((bank_pw, lanka_clear_pw), row, expected, one))
+        elif batch[0] != expected[0] or (expected[0] == "ok" and batch != expected):
+            mismatches.append(((bank_pw, lanka_clear_pw), row, expected, batch))
+    return mismatches
+
+
+def main(rows: int = DEFAULT_ROWS, pairs: int = DEFAULT_PASSWORD_PAIRS, seed: int = 1) -> bool:
+    rng = random.Random(seed)
+    cases = list(edge_rows()) + [random_row(rng) for _ in range(rows)]
+
+    passwords = [(Settings.BANK_PW, Settings.LANKA_CLEAR_PW)] + list(EDGE_PASSWORDS)
+    passwords += [(random_digits(rng, 8, 8), random_digits(rng, 8, 8)) for _ in range(pairs)]
+    passwords.append(("1234567", "12345678"))  # invalid: both paths must reject it
+
+    mismatches = []
+    for bank_pw, lanka_clear_pw in passwords:
+        found = check_passwords(bank_pw, lanka_clear_pw, cases)
+        print(f"BankPW {bank_pw!r} / LankaClearPW {lanka_clear_pw!r}: "
+              f"{len(cases):,} inputs, {len(found)} mismatches")
+        mismatches.extend(found)
+
+    for passwords_used, row, expected, actual in mismatches[:MAX_REPORTED]:
+        print(f"MISMATCH {passwords_used} {row!r}: compute() {expected} != {actual}")
+    if len(mismatches) > MAX_REPORTED:
+        print(f"... and {len(mismatches) - MAX_REPORTED} more")
+
+    print("OK: all implementations agree." if not mismatches else f"FAILED: {len(mismatches)} mismatches.")
+    return not mismatches
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Check compute_one()/compute_many() against compute()")
+    arg_parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="random inputs per password pair")
+    arg_parser.add_argument("--pairs", type=int, default=DEFAULT_PASSWORD_PAIRS, help="random password pairs")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    sys.exit(0 if main(args.rows, args.pairs, args.seed) else 1)
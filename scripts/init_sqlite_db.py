@@ -1,14 +1,125 @@
 import sqlite3
+import sys
 from pathlib import Path
 
+from SLIPS_records import account_hash_value, amount_int
 
-def initialize_database():
-    """Initialize SQLite database with schema in root directory"""
+# Columns added after the original schema: (table, column, type)
+ADDED_COLUMNS = [
+    ("OUT_Transaction", "AmountInt", "INTEGER"),
+    ("INW_Transaction", "AmountInt", "INTEGER"),
+    ("OUT_Transaction", "DestAccountInt", "INTEGER"),
+    ("INW_Transaction", "DestAccountInt", "INTEGER"),
+    ("OUT_BranchAggregate", "CodesDigest", "VARCHAR(64)"),
+    ("INW_BranchAggregate", "CodesDigest", "VARCHAR(64)"),
+    ("OUT_Transaction", "BranchIndex", "INTEGER"),
+    ("INW_Transaction", "BranchIndex", "INTEGER"),
+]
+
+# Transaction field a transaction is totalled under (and was grouped by before BranchIndex)
+BRANCH_FIELDS = {"OUT": "Originating_Branch_No", "INW": "Destination_Branch_No"}
 
+
+def get_paths():
     script_dir = Path(__file__).parent
     root_dir = script_dir.parent  # Go up one level to root
+    return script_dir, root_dir, root_dir / "SLIPS.db"
+
+
+def add_missing_columns(cursor):
+    for table, column, column_type in ADDED_COLUMNS:
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = {row[1] for row in cursor.fetchall()}
+        # A table that does not exist yet is created with the column by the migrations
+        if columns and column not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            print(f"Added column {table}.{column}")
+
+
+def backfill_typed_columns(cursor):
+    """Fill AmountInt / DestAccountInt for rows loaded before they were typed"""
+    conn = cursor.connection
+    conn.create_function("AMOUNT_INT", 1, amount_int, deterministic=True)
+    conn.create_function("ACCOUNT_HASH_VALUE", 1, account_hash_value, deterministic=True)
+
+    for prefix in ("OUT", "INW"):
+        cursor.execute(
+            f"""
+            UPDATE {prefix}_Transaction
+            SET AmountInt = AMOUNT_INT(Amount),
+                DestAccountInt = ACCOUNT_HASH_VALUE(Destination_Ac_No)
+            WHERE typeof(AmountInt) <> 'integer' OR DestAccountInt IS NULL
+            """
+        )
+        if cursor.rowcount > 0:
+            print(f"Backfilled typed amount/account columns on {cursor.rowcount} {prefix} rows")
+
+
+def backfill_branch_index(cursor):
+    """Set BranchIndex for rows loaded before it was recorded.
+
+    The file position is not known for those rows, so each transaction goes to
+    the first branch header of its file with the same branch code - the grouping
+    recreation used before. Transactions with no such header stay NULL.
+    """
+    for prefix, branch_field in BRANCH_FIELDS.items():
+        cursor.execute("DROP TABLE IF EXISTS temp.BranchPosition")
+        cursor.execute(
+            f"""
+            CREATE TEMP TABLE BranchPosition AS
+            SELECT FileName, BranchCode, MIN(Position) AS Position
+            FROM (
+                SELECT FileName, BranchCode,
+                       ROW_NUMBER() OVER (PARTITION BY FileName ORDER BY Id) - 1 AS Position
+                FROM {prefix}_BranchHeader
+            )
+            GROUP BY FileName, BranchCode
+            """
+        )
+        cursor.execute("CREATE UNIQUE INDEX temp.IX_BranchPosition ON BranchPosition (FileName, BranchCode)")
+        cursor.execute(
+            f"""
+            UPDATE {prefix}_Transaction
+            SET BranchIndex = (
+                SELECT Position FROM temp.BranchPosition AS p
+                WHERE p.FileName = {prefix}_Transaction.FileName
+                  AND p.BranchCode = {prefix}_Transaction.{branch_field}
+            )
+            WHERE BranchIndex IS NULL
+              AND (FileName, {branch_field}) IN (SELECT FileName, BranchCode FROM temp.BranchPosition)
+            """
+        )
+        if cursor.rowcount > 0:
+            print(f"Backfilled branch positions on {cursor.rowcount} {prefix} rows")
+        cursor.execute("DROP TABLE temp.BranchPosition")
+
+
+def apply_migrations(cursor, script_dir: Path):
+    """Apply the idempotent schema additions (columns, tables, indexes)"""
+    migrations_file = script_dir / "SLIPS-database-migrations.sql"
+    if not migrations_file.exists():
+        print(f"WARNING: Migrations file not found at {migrations_file}")
+        return
+
+    add_missing_columns(cursor)
+    backfill_typed_columns(cursor)
+    backfill_branch_index(cursor)
+
+    with open(migrations_file, "r") as f:
+        cursor.executescript(f.read())
+
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'IX_%' ORDER BY name;"
+    )
+    print("\nIndexes present:")
+    for index in cursor.fetchall():
+        print(f"  - {index[0]}")
 
-    db_path = root_dir / "SLIPS.db"
+
+def initialize_database():
+    """Initialize SQLite database with schema in root directory"""
+
+    script_dir, root_dir, db_path = get_paths()
     schema_file = script_dir / "SLIPS-database-creation.sql"
 
     print(f"Script directory: {script_dir}")
@@ -39,10 +150,37 @@ def initialize_database():
     for table in tables:
         print(f"  - {table[0]}")
 
+    apply_migrations(cursor, script_dir)
+
     conn.commit()
     conn.close()
     print(f"\nDatabase initialized: {db_path}")
 
 
+def migrate_database():
+    """Bring an existing SLIPS.db up to date without recreating it"""
+
+    script_dir, _, db_path = get_paths()
+
+    if not db_path.exists():
+        print(f"ERROR: Database not found at {db_path}. Run without --migrate to create it.")
+        return
+
+    print(f"Migrating database: {db_path}")
+
+    conn = sqlite3.connect(str(db_path))
+    cursor = conn.cursor()
+
+    apply_migrations(cursor, script_dir)
+    cursor.execute("ANALYZE")
+
+    conn.commit()
+    conn.close()
+    print(f"\nDatabase migrated: {db_path}")
+
+
 if __name__ == "__main__":
-    initialize_database()
+    if "--migrate" in sys.argv[1:]:
+        migrate_database()
+    else:
+        initialize_database()